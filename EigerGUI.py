@@ -1,15 +1,33 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import Label
-import requests
-import ast
+from tkinter import filedialog
+import collections
+import os
+import queue
+import sys
+import threading
 import time
-from urllib.parse import quote
 
+from acquisition import SOFTWARE_TRIGGER_MODES, TriggerScheduler
+from commands import CommandExecutor
+from config_cache import ConfigCache
+from detector_group import DetectorGroup, parse_addresses
+from diagnostics_view import DiagnosticsView
+from filewriter import FilewriterDownloader
+from monitor_consumer import MonitorConsumer
+from monitor_view import LiveView
+from schema import ParamSchema
+from simplon import SimplonClient, SimplonError, config_params, fetch_configs
+from stats_view import StatsView
+from status_monitor import DEFAULT_STATUS_KEYS, StatusMonitor
 
 
-# List of changable configuration parameters for the DEiger detector
-config_params = ['beam_center_x', 'beam_center_y', 'count_time', 'counting_mode', 'detector_distance', 'detector_orientation', 'element', 'fast_arm', 'frame_time', 'incident_energy', 'nimages', 'ntrigger', 'photon_energy', 'roi_mode', 'sample_name', 'threshold/1/energy', 'threshold/1/mode', 'threshold/2/energy', 'threshold/2/mode', 'threshold/difference/mode', 'threshold_energy', 'trigger_mode', 'detector_translation', 'kappa_increment', 'kappa_start', 'mask_to_zero', 'omega_increment', 'omega_start', 'phi_increment', 'phi_start', 'total_flux', 'trigger_start_delay', 'two_theta_increment', 'two_theta_start', 'virtual_pixel_correction_applied']
+
+
+
+# Operations whose time per detector is shown with several DCUs
+DETECTOR_TIMINGS = ("set_configuration", "arm", "trigger", "disarm", "abort")
 
 
 class ConnectionWidget:
@@ -23,10 +41,10 @@ class ConnectionWidget:
         self.create_widgets(config_params, callback)
 
     def create_widgets(self, config_params, callback):
-        self.ip_address_label = ttk.Label(self.root, text="Enter IP Address:")
+        self.ip_address_label = ttk.Label(self.root, text="Enter IP Address (several separated by commas):")
         self.ip_address_label.pack()
 
-        self.ip_address_entry = ttk.Entry(self.root, textvariable=self.ip_address_var)
+        self.ip_address_entry = ttk.Entry(self.root, textvariable=self.ip_address_var, width=40)
         self.ip_address_entry.pack()
 
         self.connect_button = ttk.Button(self.root, text="Connect", command=lambda: callback(self.ip_address_var.get()))
@@ -40,39 +58,118 @@ def connect_and_fetch(ip_address):
 
 
 class DEigerGUI:
-    def __init__(self, root, ip_address):
+    def __init__(self, root, ip_address, max_fetch_workers=8, status_keys=None, cache_path=None):
         self.root = root
         self.root.title("Eiger GUI")
 
-        self.ip_address = ip_address
-
-        self.old_param_values = {}
+        # One address or a list of them; the form shows the first detector, commands go to all
+        addresses = [ip_address] if isinstance(ip_address, str) else list(ip_address)
+        self.ip_address = addresses[0]
+        self.client = SimplonClient(self.ip_address)
+        # All clients record into one RequestStats, so the diagnostics cover every DCU
+        self.detectors = DetectorGroup([self.client] + [SimplonClient(address, stats=self.client.stats)
+                                                        for address in addresses[1:]],
+                                       on_result=lambda result: self.call_in_ui(self.show_detector_result, result))
+        self.max_fetch_workers = max_fetch_workers
+        self.status_keys = list(status_keys or DEFAULT_STATUS_KEYS)
+
+        # Last known detector configuration, restored from the snapshot of the previous session
+        self.old_param_values = ConfigCache.load(self.ip_address, cache_path)
+        self.fetched_data = {}
+        # Metadata of the config keys, taken from their first fetch in this session
+        self.param_schemas = {}
+        self.trigger_scheduler = None
+        self.live_view = None
+        self.diagnostics_view = None
+        self.stream_receiver = None
+        self.downloader = None
+        self.monitor_consumer = None
+        self.frame_stats = None
+
+        # Worker threads never touch Tk directly, they post callables here
+        self.ui_queue = queue.Queue()
+
+        # Every Simplon command of the buttons runs on this worker, never in a Tk callback
+        self.commands = CommandExecutor(self.call_in_ui, on_state=self.show_command_state,
+                                        on_error=self.show_command_error)
+        # Instances per command name, a command can be queued again while it runs
+        self.queued_commands = collections.Counter()
+        self.running_commands = collections.Counter()
 
         self.create_widgets()
+        self.register_command_buttons()
+        self.show_cached_values()
+        self.process_ui_queue()
+        self.refresh_status()
+
+        threading.Thread(target=self.fetch_params, daemon=True).start()
 
     def create_widgets(self):
         self.status_label = ttk.Label(self.root, text="Status:")
         self.status_label.pack()
 
+        # Detector Status section, one label per polled status key
+        self.status_frame = ttk.LabelFrame(self.root, text="Detector Status")
+        self.status_frame.pack(fill="both", expand="yes", padx=10, pady=10)
+
+        self.status_value_labels = {}
+        for index, key in enumerate(self.status_keys):
+            label = ttk.Label(self.status_frame, text=self.status_text(key, "..."))
+            label.grid(row=index // 5, column=index % 5, padx=5, pady=2, sticky=tk.W)
+            self.status_value_labels[key] = label
+
+        self.diagnostics_button = ttk.Button(self.status_frame, text="Request Diagnostics",
+                                             command=self.open_diagnostics)
+        self.diagnostics_button.grid(row=(len(self.status_keys) + 4) // 5, column=4, padx=5, pady=2, sticky=tk.E)
+
+        # Detectors section, only with several DCUs: state and last command times side by side
+        self.detector_labels = {}
+        if len(self.detectors) > 1:
+            self.detectors_frame = ttk.LabelFrame(self.root, text="Detectors")
+            self.detectors_frame.pack(fill="both", expand="yes", padx=10, pady=10)
+
+            for column, heading in enumerate(("Detector", "State") + tuple(f"{name.title()} ms" for name in DETECTOR_TIMINGS)):
+                ttk.Label(self.detectors_frame, text=heading).grid(row=0, column=column, padx=5, pady=2, sticky=tk.W)
+
+            for row, address in enumerate(self.detectors.addresses, start=1):
+                ttk.Label(self.detectors_frame, text=address).grid(row=row, column=0, padx=5, pady=2, sticky=tk.W)
+                for column, name in enumerate(("state",) + DETECTOR_TIMINGS, start=1):
+                    label = ttk.Label(self.detectors_frame, text="...")
+                    label.grid(row=row, column=column, padx=5, pady=2, sticky=tk.W)
+                    self.detector_labels[(address, name)] = label
+
+            self.skew_label = ttk.Label(self.detectors_frame, text="")
+            self.skew_label.grid(row=len(self.detectors) + 1, column=0, columnspan=len(DETECTOR_TIMINGS) + 2,
+                                 padx=5, pady=2, sticky=tk.W)
+
         self.config_frame = ttk.Frame(self.root)
         self.config_frame.pack()
 
         self.param_entries = {}
+        self.param_labels = {}
 
-        self.fetch_params()
+        # Styles for entries and dropdowns: Error for values that could not be fetched or are invalid,
+        # Cached and Changed for values from the snapshot cache, not yet confirmed or differing from the detector
+        style = ttk.Style()
+        for widget in ("TEntry", "TCombobox"):
+            style.configure(f"Error.{widget}", foreground="red")
+            style.configure(f"Cached.{widget}", foreground="gray")
+            style.configure(f"Changed.{widget}", foreground="blue")
 
         for row, param in enumerate(config_params):
             col = row % 3  # Determine the column (0, 1, or 2)
             label = ttk.Label(self.config_frame, text=param.replace("_", " ").title())
             label.grid(row=row // 3, column=col * 2, padx=5, pady=5, sticky=tk.W)
+            self.param_labels[param] = label
 
             
             entry = ttk.Entry(self.config_frame)
             entry.grid(row=row // 3, column=col * 2 + 1, padx=5, pady=5)
             self.param_entries[param] = entry
 
-            value = self.fetched_data.get(param)["value"]
-            entry.insert(0, value)
+            # Placeholder until the value arrives from the detector
+            entry.insert(0, "...")
+            entry.config(state="disabled")
 
         self.set_config_button = ttk.Button(self.root, text="Set Configuration", command=self.set_configuration)
         self.set_config_button.pack()
@@ -97,6 +194,14 @@ class DEigerGUI:
                                                  command=lambda: self.set_monitor_mode('disabled'))
         self.disable_monitor_button.grid(row=1, column=1, padx=5, pady=5)
 
+        self.live_view_button = ttk.Button(self.data_interface_frame, text="Open Live View",
+                                           command=self.open_live_view)
+        self.live_view_button.grid(row=1, column=2, padx=5, pady=5, sticky=tk.W)
+
+        self.frame_stats_button = ttk.Button(self.data_interface_frame, text="Open Frame Statistics",
+                                             command=self.open_frame_stats)
+        self.frame_stats_button.grid(row=1, column=3, padx=5, pady=5, sticky=tk.W)
+
         self.file_name_label = ttk.Label(self.data_interface_frame, text="File Name Pattern:")
         self.file_name_label.grid(row=0, column=2, padx=5, pady=5, sticky=tk.W)
 
@@ -107,6 +212,27 @@ class DEigerGUI:
                                                command=self.set_file_name)
         self.set_file_name_button.grid(row=0, column=4, padx=5, pady=5)
 
+        self.enable_stream_button = ttk.Button(self.data_interface_frame, text="Enable Stream",
+                                               command=lambda: self.set_stream_mode('enabled'))
+        self.enable_stream_button.grid(row=2, column=0, padx=5, pady=5)
+
+        self.disable_stream_button = ttk.Button(self.data_interface_frame, text="Disable Stream",
+                                                command=lambda: self.set_stream_mode('disabled'))
+        self.disable_stream_button.grid(row=2, column=1, padx=5, pady=5)
+
+        self.header_detail_var = tk.StringVar(value="basic")
+        self.header_detail_combo = ttk.Combobox(self.data_interface_frame, textvariable=self.header_detail_var,
+                                                values=("all", "basic", "none"), state="readonly", width=8)
+        self.header_detail_combo.grid(row=2, column=2, padx=5, pady=5, sticky=tk.W)
+        self.header_detail_combo.bind("<<ComboboxSelected>>", lambda event: self.set_stream_header_detail())
+
+        self.stream_receiver_button = ttk.Button(self.data_interface_frame, text="Start Receiver",
+                                                 command=self.toggle_stream_receiver)
+        self.stream_receiver_button.grid(row=2, column=3, padx=5, pady=5)
+
+        self.stream_rate_label = ttk.Label(self.data_interface_frame, text="Receiver stopped.")
+        self.stream_rate_label.grid(row=2, column=4, padx=5, pady=5, sticky=tk.W)
+
 
        # Arm and Trigger section
         self.arm_trigger_frame = ttk.LabelFrame(self.root, text="Arm and Trigger")
@@ -138,7 +264,83 @@ class DEigerGUI:
         self.trigger_button = ttk.Button(self.arm_trigger_frame, text="Arm and Trigger", command=self.trigger_detector)
         self.trigger_button.grid(row=1, column=6, padx=5, pady=5, sticky=tk.W)
 
-        
+        self.wait_for_idle_var = tk.BooleanVar(value=False)
+        self.wait_for_idle_check = ttk.Checkbutton(self.arm_trigger_frame, text="Wait for Detector Idle",
+                                                   variable=self.wait_for_idle_var)
+        self.wait_for_idle_check.grid(row=2, column=4, padx=5, pady=5, sticky=tk.W)
+
+        # Series mode: re-arm for every trigger, or arm once with ntrigger and fire all triggers
+        self.series_mode_var = tk.StringVar(value="rearm")
+        self.rearm_radio = ttk.Radiobutton(self.arm_trigger_frame, text="Re-arm per Trigger",
+                                           variable=self.series_mode_var, value="rearm")
+        self.rearm_radio.grid(row=2, column=5, padx=5, pady=5, sticky=tk.W)
+
+        self.single_arm_radio = ttk.Radiobutton(self.arm_trigger_frame, text="Single Arm (ntrigger)",
+                                                variable=self.series_mode_var, value="single_arm")
+        self.single_arm_radio.grid(row=2, column=6, padx=5, pady=5, sticky=tk.W)
+
+        # Filewriter Download section
+        self.download_frame = ttk.LabelFrame(self.root, text="Filewriter Download")
+        self.download_frame.pack(fill="both", expand="yes", padx=10, pady=10)
+
+        self.download_dir_label = ttk.Label(self.download_frame, text="Download Directory:")
+        self.download_dir_label.grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
+
+        self.download_dir_entry = ttk.Entry(self.download_frame, width=40)
+        self.download_dir_entry.grid(row=0, column=1, padx=5, pady=5)
+        self.download_dir_entry.insert(0, os.getcwd())
+
+        self.browse_button = ttk.Button(self.download_frame, text="Browse", command=self.browse_download_dir)
+        self.browse_button.grid(row=0, column=2, padx=5, pady=5)
+
+        self.delete_after_download_var = tk.BooleanVar(value=True)
+        self.delete_after_download_check = ttk.Checkbutton(self.download_frame, text="Delete on DCU after Download",
+                                                           variable=self.delete_after_download_var)
+        self.delete_after_download_check.grid(row=0, column=3, padx=5, pady=5, sticky=tk.W)
+
+        self.download_button = ttk.Button(self.download_frame, text="Start Download", command=self.toggle_download)
+        self.download_button.grid(row=1, column=0, padx=5, pady=5)
+
+        self.download_label = ttk.Label(self.download_frame, text="Download stopped.")
+        self.download_label.grid(row=1, column=1, columnspan=3, padx=5, pady=5, sticky=tk.W)
+
+        # Monitor Buffer section: drains the monitor continuously instead of clearing it by hand
+        self.consumer_frame = ttk.LabelFrame(self.root, text="Monitor Buffer")
+        self.consumer_frame.pack(fill="both", expand="yes", padx=10, pady=10)
+
+        self.buffer_size_label = ttk.Label(self.consumer_frame, text="DCU Buffer Size:")
+        self.buffer_size_label.grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
+
+        self.buffer_size_entry = ttk.Entry(self.consumer_frame, width=8)
+        self.buffer_size_entry.grid(row=0, column=1, padx=5, pady=5, sticky=tk.W)
+
+        self.discard_new_var = tk.BooleanVar(value=False)
+        self.discard_new_check = ttk.Checkbutton(self.consumer_frame, text="Discard New when Full",
+                                                 variable=self.discard_new_var)
+        self.discard_new_check.grid(row=0, column=2, padx=5, pady=5, sticky=tk.W)
+
+        self.ring_size_label = ttk.Label(self.consumer_frame, text="Frames in Memory:")
+        self.ring_size_label.grid(row=0, column=3, padx=5, pady=5, sticky=tk.W)
+
+        self.ring_size_entry = ttk.Entry(self.consumer_frame, width=8)
+        self.ring_size_entry.grid(row=0, column=4, padx=5, pady=5, sticky=tk.W)
+        self.ring_size_entry.insert(0, "64")
+
+        self.spill_path_label = ttk.Label(self.consumer_frame, text="Spill File (optional):")
+        self.spill_path_label.grid(row=1, column=0, padx=5, pady=5, sticky=tk.W)
+
+        self.spill_path_entry = ttk.Entry(self.consumer_frame, width=40)
+        self.spill_path_entry.grid(row=1, column=1, columnspan=3, padx=5, pady=5, sticky=tk.W)
+
+        self.spill_browse_button = ttk.Button(self.consumer_frame, text="Browse", command=self.browse_spill_path)
+        self.spill_browse_button.grid(row=1, column=4, padx=5, pady=5)
+
+        self.consumer_button = ttk.Button(self.consumer_frame, text="Start Draining", command=self.toggle_monitor_consumer)
+        self.consumer_button.grid(row=2, column=0, padx=5, pady=5)
+
+        self.consumer_label = ttk.Label(self.consumer_frame, text="Draining stopped.")
+        self.consumer_label.grid(row=2, column=1, columnspan=4, padx=5, pady=5, sticky=tk.W)
+
         # Clear Buffer and Filewriter Storage section
         self.clear_frame = ttk.LabelFrame(self.root, text="Clear Buffer and Filewriter Storage")
         self.clear_frame.pack(fill="both", expand="yes", padx=10, pady=10)
@@ -161,77 +363,251 @@ class DEigerGUI:
 
 
 
+    def register_command_buttons(self):
+        commands = {
+            self.set_config_button: ["set_configuration"],
+            self.enable_filewriter_button: ["filewriter_mode"],
+            self.disable_filewriter_button: ["filewriter_mode"],
+            self.enable_monitor_button: ["monitor_mode"],
+            self.disable_monitor_button: ["monitor_mode"],
+            self.enable_stream_button: ["stream_mode"],
+            self.disable_stream_button: ["stream_mode"],
+            self.set_file_name_button: ["file_name"],
+            self.arm_trigger_button: ["arm", "trigger"],
+            self.trigger_button: ["trigger"],
+            self.disarm_button: ["disarm"],
+            self.clear_buffer_button: ["clear_buffer"],
+            self.clear_filewriter_button: ["clear_filewriter"],
+            self.interrupt_measurement_button: ["abort"],
+        }
+
+        self.button_commands = commands
+        self.button_texts = {button: button.cget("text") for button in commands}
+        self.command_buttons = {}
+        for button, names in commands.items():
+            for name in names:
+                self.command_buttons.setdefault(name, []).append(button)
+
+    def call_in_ui(self, func, *args):
+        self.ui_queue.put((func, args))
+
+    def process_ui_queue(self):
+        # Run everything the worker threads posted, then check again shortly
+        try:
+            while True:
+                try:
+                    func, args = self.ui_queue.get_nowait()
+                except queue.Empty:
+                    break
+                # One failing callback is reported like any Tk callback, the others still run
+                try:
+                    func(*args)
+                except Exception:
+                    self.root.report_callback_exception(*sys.exc_info())
+        finally:
+            self.root.after(20, self.process_ui_queue)
+
     def fetch_params(self):
-        self.fetched_data = self.fetch_param_values(config_params, self.ip_address)
-        for param, value in self.fetched_data.items():
-            self.old_param_values[param] = value
+        # Runs on a worker thread, every value is filled in as soon as it arrives
+        self.call_in_ui(self.update_status, "Fetching parameters...")
+        fetched_data = self.fetch_param_values(config_params)
 
-        self.update_status("Parameters fetched successfully.")
+        self.call_in_ui(self.save_config_cache)
+
+        failed = [param for param, data in fetched_data.items() if "error" in data]
+        if failed:
+            self.call_in_ui(self.update_status, f"Failed to fetch parameters: {', '.join(failed)}")
+        else:
+            self.call_in_ui(self.update_status, "Parameters fetched successfully.")
     
     
-    def fetch_param_values(self, params, ip_address):
+    def fetch_param_values(self, params):
         fetched_data = {}
 
-        for param in params:
-            # URL encode the parameter name
-            encoded_param = quote(param)
-
-            # Construct the URL with the encoded parameter name
-            url = f"http://{ip_address}/detector/api/1.8.0/config/{encoded_param}"
-            response = requests.get(url)
-
-            if response.status_code == 200:
-                data = response.json()
-                fetched_data[param] = {
-                    "value": str(data.get("value", "Error")),
-                    "value_type": data.get("value_type", "string")  # Default to string
-                }
+        def on_result(param, data, error):
+            if error is None:
+                fetched_data[param] = self.param_data(data)
+                if param not in self.param_schemas:
+                    self.call_in_ui(self.apply_param_schema, param, ParamSchema.from_data(data))
             else:
-                fetched_data[param] = {
-                    "value": "Error",
-                    "value_type": "string"
-                }
+                fetched_data[param] = {"error": str(error)}
+            self.call_in_ui(self.show_param_value, param, fetched_data[param])
+
+        fetch_configs(self.client, params, max_workers=self.max_fetch_workers, on_result=on_result)
 
         return fetched_data
 
+    @staticmethod
+    def param_data(data):
+        # Convert the JSON description of a config key into the form the GUI keeps
+        return {
+            "value": str(data.get("value")),
+            "value_type": data.get("value_type", "string"),  # Default to string
+            "timestamp": time.time()
+        }
+
+    def apply_param_schema(self, param, schema):
+        # Typed widget for the key: a dropdown for a fixed set of values, read only if not writable
+        if param in self.param_schemas:
+            return
+        self.param_schemas[param] = schema
+
+        if schema.unit:
+            self.param_labels[param].config(text=f"{param.replace('_', ' ').title()} [{schema.unit}]")
+
+        entry = self.param_entries[param]
+        if schema.choices is not None and schema.writable:
+            style = str(entry.cget("style"))
+            combobox = ttk.Combobox(self.config_frame, values=schema.choices)
+            combobox.insert(0, entry.get())
+            combobox.grid(**{key: value for key, value in entry.grid_info().items() if key != "in"})
+            entry.destroy()
+            self.param_entries[param] = entry = combobox
+            self.set_entry_style(param, style.split(".")[0] if "." in style else None)
+
+        entry.config(state=self.entry_state(param))
+
+    def entry_state(self, param):
+        schema = self.param_schemas.get(param)
+        if schema is not None and (not schema.writable or schema.choices is not None):
+            return "readonly"
+        return "normal"
+
+    def set_entry_style(self, param, kind=None):
+        entry = self.param_entries[param]
+        widget = "TCombobox" if isinstance(entry, ttk.Combobox) else "TEntry"
+        entry.config(style=f"{kind}.{widget}" if kind else widget)
+
+    def show_cached_values(self):
+        # Fill the form from the snapshot right away, the background fetch reconciles it
+        for param, data in self.old_param_values.items():
+            entry = self.param_entries.get(param)
+            if entry is None:
+                continue
+            entry.config(state="normal")
+            self.set_entry_style(param, "Cached")
+            entry.delete(0, tk.END)
+            entry.insert(0, data["value"])
+
+    def show_param_value(self, param, data):
+        self.fetched_data[param] = data
+
+        entry = self.param_entries[param]
+        previous = self.old_param_values.get(param)
+
+        # Do not overwrite a value the user started editing while the fetch was running
+        edited = previous is not None and entry.get() != previous["value"]
+        entry.config(state="normal")
+
+        if "error" in data:
+            # Mark the entry, a cached value stays the best known state
+            self.set_entry_style(param, "Error")
+            if previous is None:
+                entry.delete(0, tk.END)
+            entry.config(state=self.entry_state(param))
+            return
+
+        if not edited:
+            entry.delete(0, tk.END)
+            entry.insert(0, data["value"])
+        entry.config(state=self.entry_state(param))
+
+        # Highlight values which differ from the snapshot
+        changed = previous is not None and previous["value"] != data["value"]
+        self.set_entry_style(param, "Changed" if changed else None)
+
+        self.old_param_values.set_value(param, data["value"], data["value_type"], data.get("timestamp"))
+
+    def save_config_cache(self):
+        try:
+            self.old_param_values.save()
+        except OSError as e:
+            self.update_status(f"Error saving configuration snapshot: {str(e)}")
+
     def set_configuration(self):
         try:
-            # Construct the base URL for setting detector configuration
-            base_url = f"http://{self.ip_address}/detector/api/1.8.0/config/"
+            changes = {}
+            invalid = {}
 
             for param in config_params:
                 entry = self.param_entries[param]
                 new_value = entry.get()
                 old_data = self.old_param_values.get(param, {})
 
-                fetched_value = old_data.get("value")
-                fetched_value_type = old_data.get("value_type")
-
-                if new_value != fetched_value:
-                    if fetched_value_type == "bool":
-                        new_value = ast.literal_eval(new_value)
-                    elif fetched_value_type == "float":
-                        new_value = float(new_value)
-                    elif fetched_value_type == "uint":
-                        new_value = int(new_value)
-
-                    # Construct the specific URL for setting the parameter
-                    url = f"{base_url}{param}"
-
-                    # Make the PUT request for setting the detector configuration parameter
-                    response = requests.put(url, json={"value": new_value})
-
-                    # Check if the request was successful 
-                    if response.status_code // 100 == 2:
-                        self.old_param_values[param] = {
-                            "value": new_value,
-                            "value_type": fetched_value_type
-                        }
-                        self.update_status(f"Configuration set successfully for parameter: {param}")
-                    else:
-                        self.update_status(f"Error setting configuration for parameter {param}. Status code: {response.status_code}")
+                if not old_data and new_value in ("", "..."):
+                    # Value was never fetched and the user did not enter one
+                    continue
+
+                if new_value == old_data.get("value"):
+                    continue
+
+                # Validated against the metadata of the key before anything is sent, an invalid
+                # value is marked and skipped while the valid ones are still applied
+                schema = self.param_schemas.get(param) or ParamSchema(old_data.get("value_type", "string"))
+                if not schema.writable:
+                    continue
+                try:
+                    changes[param] = schema.parse(new_value)
+                except ValueError as e:
+                    invalid[param] = str(e)
+                    self.set_entry_style(param, "Error")
+
+            if not changes:
+                if invalid:
+                    self.update_status(f"Invalid values: {self.invalid_text(invalid)}")
+                else:
+                    self.update_status("No configuration changes.")
+                return
+
+            # Entry texts as submitted, the cache keeps them for the applied keys
+            texts = {param: self.param_entries[param].get() for param in changes}
+
+            def run():
+                # PUT in dependency order on every detector at once, then re-fetch only what changed
+                results = self.detectors.apply_configs(changes, refresh_keys=config_params,
+                                                       max_workers=self.max_fetch_workers)
+                self.call_in_ui(self.show_config_result, results.pop(self.ip_address), texts, results, invalid)
+
+            # Repeated clicks before the apply started replace the pending one
+            self.run_command("set_configuration", run)
+
+        except Exception as e:
+            # Handle other exceptions or errors here
+            self.update_status(f"Error setting configuration: {str(e)}")
+
+    @staticmethod
+    def invalid_text(invalid):
+        return "; ".join(f"{param}: {reason}" for param, reason in invalid.items())
+
+    def show_config_result(self, result, texts, others=None, invalid=None):
+        try:
+            for param in result.applied:
+                value_type = self.old_param_values.get(param, {}).get("value_type")
+                self.old_param_values.set_value(param, texts[param], value_type)
+
+            for param, data in result.refreshed.items():
+                if isinstance(data, Exception):
+                    self.show_param_value(param, {"error": str(data)})
                 else:
-                    self.update_status(f"No change for parameter: {param}")
+                    self.show_param_value(param, self.param_data(data))
+
+            self.save_config_cache()
+
+            # The other detectors are not shown in the form, only their failures are reported
+            errors = [f"{param} (status code {e.status_code})" for param, e in result.errors.items()]
+            for address, other in (others or {}).items():
+                errors += [f"{param} on {address} (status code {e.status_code})" for param, e in other.errors.items()]
+
+            if invalid:
+                errors.append(f"invalid values ({self.invalid_text(invalid)})")
+
+            if errors and result.applied:
+                self.update_status(f"Configuration set for parameters: {', '.join(result.applied)}; "
+                                   f"not set: {', '.join(errors)}")
+            elif errors:
+                self.update_status(f"Error setting configuration for parameters: {', '.join(errors)}")
+            else:
+                self.update_status(f"Configuration set successfully for parameters: {', '.join(result.applied)}")
 
         except Exception as e:
             # Handle other exceptions or errors here
@@ -239,228 +615,538 @@ class DEigerGUI:
 
     
     def clear_buffer(self):
-        # Send command to clear the buffer
-        url = f"http://{self.ip_address}/monitor/api/1.8.0/command/clear"
-        response = requests.put(url)
+        def run():
+            # Send command to clear the buffer
+            try:
+                self.detectors.fan_out("clear_buffer", lambda client: client.monitor_command("clear"))
+                self.update_status("Buffer cleared.")
+            except SimplonError:
+                self.update_status("Failed to clear buffer.")
 
-        if response.status_code == 200:
-            self.update_status("Buffer cleared.")
-        else:
-            self.update_status("Failed to clear buffer.")
+        self.run_command("clear_buffer", run)
 
     def clear_filewriter(self):
-        # Send command to clear filewriter storage
-        url = f"http://{self.ip_address}/filewriter/api/1.8.0/command/clear"
-        response = requests.put(url)
+        def run():
+            # Send command to clear filewriter storage
+            try:
+                self.detectors.fan_out("clear_filewriter", lambda client: client.filewriter_command("clear"))
+                self.update_status("Filewriter storage cleared.")
+            except SimplonError:
+                self.update_status("Failed to clear filewriter storage.")
+
+        self.run_command("clear_filewriter", run)
+
+    def browse_download_dir(self):
+        directory = filedialog.askdirectory(initialdir=self.download_dir_entry.get())
+        if directory:
+            self.download_dir_entry.delete(0, tk.END)
+            self.download_dir_entry.insert(0, directory)
+
+    def toggle_download(self):
+        if self.downloader is not None:
+            self.root.after_cancel(self.download_after_id)
+            self.downloader.stop()
+            self.downloader = None
+            self.download_button.config(text="Start Download")
+            self.download_label.config(text="Download stopped.")
+            return
+
+        def on_error(name, error):
+            self.call_in_ui(self.update_status, f"Error downloading {name or 'file list'}: {error}")
+
+        # Runs until stopped, so the DCU storage is emptied while series are running
+        self.downloader = FilewriterDownloader(self.client, self.download_dir_entry.get(),
+                                               delete=self.delete_after_download_var.get(), on_error=on_error)
+        self.downloader.start()
+        self.download_button.config(text="Stop Download")
+        self.update_download_progress()
+
+    def update_download_progress(self):
+        if self.downloader is None:
+            return
+
+        stats = self.downloader.stats
+        self.download_label.config(text=f"{stats.files} files, {stats.bytes / 1e6:.1f} MB, {stats.rate():.1f} MB/s, "
+                                        f"{len(self.downloader.active)} active, {stats.errors} errors")
+        self.download_after_id = self.root.after(1000, self.update_download_progress)
+
+    def browse_spill_path(self):
+        path = filedialog.asksaveasfilename(defaultextension=".npy", filetypes=[("NumPy array", "*.npy")])
+        if path:
+            self.spill_path_entry.delete(0, tk.END)
+            self.spill_path_entry.insert(0, path)
+
+    def toggle_monitor_consumer(self):
+        if self.monitor_consumer is not None:
+            self.root.after_cancel(self.consumer_after_id)
+            consumer, self.monitor_consumer = self.monitor_consumer, None
+            consumer.stop()
+            # Waits for the request in flight before the spill file is closed, off the Tk thread
+            threading.Thread(target=consumer.join, daemon=True).start()
+            if self.live_view is not None:
+                self.live_view.set_image("next")
+            self.consumer_button.config(text="Start Draining")
+            self.consumer_label.config(text="Draining stopped.")
+            return
 
-        if response.status_code == 200:
-            self.update_status("Filewriter storage cleared.")
-        else:
-            self.update_status("Failed to clear filewriter storage.")
-
-    def set_filewriter_mode(self, mode):
         try:
-            # Construct the URL for setting filewriter mode
-            url = f"http://{self.ip_address}/filewriter/api/1.8.0/config/mode"
+            buffer_size = int(self.buffer_size_entry.get()) if self.buffer_size_entry.get().strip() else None
+            capacity = int(self.ring_size_entry.get())
+            if capacity < 1 or (buffer_size is not None and buffer_size < 1):
+                raise ValueError("sizes must be at least 1")
+        except ValueError as e:
+            self.update_status(f"Error starting the monitor drain: {e}")
+            return
+
+        def on_error(error):
+            self.call_in_ui(self.update_status, f"Monitor drain error: {error}")
+
+        consumer = MonitorConsumer(self.client, capacity, buffer_size, self.discard_new_var.get(),
+                                   self.spill_path_entry.get().strip() or None, on_frame=self.feed_frame_stats,
+                                   on_error=on_error)
+        self.monitor_consumer = consumer
+
+        def run():
+            # Configuring the monitor is a request, so it is queued like the other commands
+            try:
+                consumer.start()
+            except SimplonError as e:
+                self.call_in_ui(self.show_monitor_consumer_error, consumer, e)
+
+        # Not cancelled by abort or disarm, the button already shows the drain as running
+        self.run_command("monitor_consumer", run, cancellable=False)
+
+        # The live view must not take images out of the buffer the drain empties
+        if self.live_view is not None:
+            self.live_view.set_image("monitor")
+        self.consumer_button.config(text="Stop Draining")
+        self.update_monitor_consumer()
+
+    def show_monitor_consumer_error(self, consumer, error):
+        if self.monitor_consumer is consumer:
+            self.toggle_monitor_consumer()
+        self.update_status(f"Error configuring the monitor buffer: {error}")
+
+    def update_monitor_consumer(self):
+        if self.monitor_consumer is None:
+            return
+        self.consumer_label.config(text=self.monitor_consumer.status_text())
+        self.consumer_after_id = self.root.after(500, self.update_monitor_consumer)
 
-            # Prepare the data for the PUT request
-            data = {"value": mode}
-
-            # Make the PUT request using the requests library
-            response = requests.put(url, json=data)
+    def set_filewriter_mode(self, mode):
+        def run():
+            try:
+                # Make the PUT request for setting filewriter mode
+                self.detectors.fan_out("filewriter_mode", lambda client: client.set_filewriter_config("mode", mode))
 
-            # Check if the request was successful (status code 2xx)
-            if response.status_code // 100 == 2:
                 # Update the status in the GUI
                 self.update_status(f"Filewriter mode set to: {mode.capitalize()}")
-            else:
-                # If the request was not successful, update the status with an error message
-                self.update_status(f"Error setting filewriter mode. Status code: {response.status_code}")
-        except Exception as e:
-            # Handle other exceptions or errors here
-            self.update_status(f"Error setting filewriter mode: {str(e)}")
+            except Exception as e:
+                # Handle other exceptions or errors here
+                self.update_status(f"Error setting filewriter mode: {str(e)}")
+
+        self.run_command("filewriter_mode", run)
 
     def set_monitor_mode(self, mode):
-        try:
-            # Construct the URL for setting monitor mode
-            url = f"http://{self.ip_address}/monitor/api/1.8.0/config/mode"
+        def run():
+            try:
+                # Make the PUT request for setting monitor mode
+                self.detectors.fan_out("monitor_mode", lambda client: client.set_monitor_config("mode", mode))
+
+                # Update the status in the GUI
+                self.update_status(f"Monitor mode set to: {mode.capitalize()}")
+            except Exception as e:
+                # Handle other exceptions or errors here
+                self.update_status(f"Error setting monitor mode: {str(e)}")
 
-            # Prepare the data for the PUT request
-            data = {"value": mode}
+        self.run_command("monitor_mode", run)
 
-            # Make the PUT request using the requests library
-            response = requests.put(url, json=data)
+    def set_stream_mode(self, mode):
+        def run():
+            try:
+                # Make the PUT request for setting stream mode
+                self.detectors.fan_out("stream_mode", lambda client: client.set_stream_config("mode", mode))
 
-            # Check if the request was successful 
-            if response.status_code // 100 == 2:
                 # Update the status in the GUI
-                self.update_status(f"Monitor mode set to: {mode.capitalize()}")
+                self.update_status(f"Stream mode set to: {mode.capitalize()}")
+            except Exception as e:
+                # Handle other exceptions or errors here
+                self.update_status(f"Error setting stream mode: {str(e)}")
+
+        self.run_command("stream_mode", run)
+
+    def set_stream_header_detail(self):
+        detail = self.header_detail_var.get()
+
+        def run():
+            try:
+                self.detectors.fan_out("stream_header_detail",
+                                       lambda client: client.set_stream_config("header_detail", detail))
+                self.update_status(f"Stream header detail set to: {detail}")
+            except Exception as e:
+                self.update_status(f"Error setting stream header detail: {str(e)}")
+
+        self.run_command("stream_header_detail", run)
+
+    def toggle_stream_receiver(self):
+        if self.stream_receiver is not None:
+            self.root.after_cancel(self.stream_rate_after_id)
+            self.stream_receiver.stop()
+            self.stream_receiver = None
+            self.stream_receiver_button.config(text="Start Receiver")
+            self.stream_rate_label.config(text="Receiver stopped.")
+            return
+
+        # pyzmq and lz4 are only needed for the stream interface
+        try:
+            from stream import StreamReceiver
+        except ImportError as e:
+            self.update_status(f"The stream receiver needs pyzmq and lz4: {e}")
+            return
+
+        def on_series(message):
+            if message["htype"].startswith("dseries_end"):
+                self.call_in_ui(self.update_status, f"Stream series {message.get('series')} ended.")
             else:
-                # If the request was not successful, update the status with an error message
-                self.update_status(f"Error setting monitor mode. Status code: {response.status_code}")
-        except Exception as e:
-            # Handle other exceptions or errors here
-            self.update_status(f"Error setting monitor mode: {str(e)}")
+                self.call_in_ui(self.update_status, f"Stream series {message.get('series')} started.")
+
+        def on_frame(info, array, release):
+            try:
+                self.feed_frame_stats(array, info.get("frame"))
+            finally:
+                release()
+
+        self.stream_receiver = StreamReceiver(self.ip_address, on_frame=on_frame, on_series=on_series)
+        self.stream_receiver.start()
+        self.stream_receiver_button.config(text="Stop Receiver")
+        self.update_stream_rate()
+
+    def update_stream_rate(self):
+        if self.stream_receiver is None:
+            return
+
+        frame_rate, byte_rate = self.stream_receiver.rates()
+        self.stream_rate_label.config(text=f"{frame_rate:.1f} frames/s, {byte_rate:.1f} MB/s, "
+                                           f"{self.stream_receiver.stats.frames} frames")
+        self.stream_rate_after_id = self.root.after(1000, self.update_stream_rate)
+
+    def open_live_view(self):
+        if self.live_view is not None:
+            self.live_view.parent.lift()
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title("Eiger Live View")
+        self.live_view = LiveView(window, self.client, image="next" if self.monitor_consumer is None else "monitor",
+                                  on_status=lambda text: self.call_in_ui(self.update_status, text))
+        window.protocol("WM_DELETE_WINDOW", self.close_live_view)
+
+    def close_live_view(self):
+        self.live_view.stop()
+        self.live_view.parent.destroy()
+        self.live_view = None
+
+    def feed_frame_stats(self, frame, number=None):
+        # Called from the receiving threads, the statistics copy the frame before this returns
+        frame_stats = self.frame_stats
+        if frame_stats is not None:
+            frame_stats.submit(frame, number)
+
+    def open_frame_stats(self):
+        if self.frame_stats is not None:
+            self.frame_stats.parent.lift()
+            return
+
+        # Without mask_to_zero the invalid pixels carry the maximum value and are left out of the statistics
+        mask_to_zero = str(self.old_param_values.get("mask_to_zero", {}).get("value", True)).lower() == "true"
+
+        # The monitor and the stream send one image per frame, the difference of the thresholds when it is enabled
+        difference = self.old_param_values.get("threshold/difference/mode", {}).get("value") == "enabled"
+        image_label = "threshold 1 - 2" if difference else "threshold 1"
+
+        window = tk.Toplevel(self.root)
+        window.title("Eiger Frame Statistics")
+        self.frame_stats = StatsView(window, mask_to_zero, image_label,
+                                     on_status=lambda text: self.call_in_ui(self.update_status, text))
+        window.protocol("WM_DELETE_WINDOW", self.close_frame_stats)
+
+    def close_frame_stats(self):
+        frame_stats, self.frame_stats = self.frame_stats, None
+        frame_stats.stop()
+        frame_stats.parent.destroy()
+
+    def open_diagnostics(self):
+        if self.diagnostics_view is not None:
+            self.diagnostics_view.parent.lift()
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title("Eiger Request Diagnostics")
+        self.diagnostics_view = DiagnosticsView(window, self.client.stats, on_status=self.update_status)
+        window.protocol("WM_DELETE_WINDOW", self.close_diagnostics)
+
+    def close_diagnostics(self):
+        self.diagnostics_view.stop()
+        self.diagnostics_view.parent.destroy()
+        self.diagnostics_view = None
 
     def set_file_name(self):
-        try:
-            # Construct the URL for setting the file name
-            url = f"http://{self.ip_address}/filewriter/api/1.8.0/config/name_pattern"
-
-            # Get the new file name from the entry widget in your GUI 
-            new_file_name = self.file_name_entry.get()
-
-            # Prepare the data for the PUT request
-            data = {"value": new_file_name}
+        # Get the new file name from the entry widget in your GUI 
+        new_file_name = self.file_name_entry.get()
 
-            # Make the PUT request using the requests library
-            response = requests.put(url, json=data)
+        def run():
+            try:
+                # Make the PUT request for setting the file name
+                self.detectors.fan_out("file_name",
+                                       lambda client: client.set_filewriter_config("name_pattern", new_file_name))
 
-            # Check if the request was successful 
-            if response.status_code // 100 == 2:
                 # Update the status in the GUI
                 self.update_status(f"File name pattern set: {new_file_name}")
-            else:
-                # If the request was not successful, update the status with an error message
-                self.update_status(f"Error setting file name pattern. Status code: {response.status_code}")
-        except Exception as e:
-            # Handle other exceptions or errors here
-            self.update_status(f"Error setting file name pattern: {str(e)}")
+            except Exception as e:
+                # Handle other exceptions or errors here
+                self.update_status(f"Error setting file name pattern: {str(e)}")
+
+        self.run_command("file_name", run)
 
     
     def arm_detector(self):
-        try:
-            # Construct the URL for arming the detector
-            url = f"http://{self.ip_address}/detector/api/1.8.0/command/arm"
-
-            # Make the PUT request for arming the detector
-            response = requests.put(url)
+        def run():
+            try:
+                # Arm every detector at once, returns when all of them are armed
+                self.detectors.arm()
 
-            # Check if the request was successful 
-            if response.status_code // 100 == 2:
                 # Update the status in the GUI
-                self.update_status("Detector armed.")
-            else:
-                # If the request was not successful, update the status with an error message
-                self.update_status(f"Error arming the detector. Status code: {response.status_code}")
-        except Exception as e:
-            # Handle other exceptions or errors here
-            self.update_status(f"Error arming the detector: {str(e)}")
+                self.update_status("Detector armed." if len(self.detectors) == 1
+                                   else f"{len(self.detectors)} detectors armed.")
+            except Exception as e:
+                # Handle other exceptions or errors here
+                self.update_status(f"Error arming the detector: {str(e)}")
+
+        self.run_command("arm", run)
 
     def trigger_detector(self):
         try:
             self.pause_between_triggers = float(self.pause_entry.get())
             self.num_triggers = int(self.num_triggers_entry.get())
+        except ValueError as e:
+            self.update_status(f"Error triggering the detector: {str(e)}")
+            return
 
-            if self.num_triggers > 0:
-                self.trigger_loop()
-
-            else:
-                # Construct the URL for triggering the detector
-                url = f"http://{self.ip_address}/detector/api/1.8.0/command/trigger"
+        if self.num_triggers > 0:
+            self.trigger_loop()
+            return
 
+        def run():
+            try:
                 # Make the PUT request for triggering the detector
-                response = requests.put(url)
+                self.detectors.trigger()
 
-            # Check if the request was successful 
-            if response.status_code // 100 == 2:
                 # Update the status in the GUI
                 self.update_status("Detector triggered.")
-            else:
-                # If the request was not successful, update the status with an error message
-                self.update_status(f"Error triggering the detector. Status code: {response.status_code}")
-        except Exception as e:
-            # Handle other exceptions or errors here
-            self.update_status(f"Error triggering the detector: {str(e)}")
+            except Exception as e:
+                # Handle other exceptions or errors here
+                self.update_status(f"Error triggering the detector: {str(e)}")
+
+        self.run_command("trigger", run)
 
     def interrupt_measurement(self):
-        try:
-            # Construct the URL for interrupting the measurement
-            url = f"http://{self.ip_address}/detector/api/1.8.0/command/abort"
+        # Stop a running trigger series before aborting, so it does not fire again
+        if self.trigger_scheduler is not None:
+            self.trigger_scheduler.cancel()
 
-            # Make the PUT request for interrupting the measurement
-            response = requests.put(url)
+        def run():
+            try:
+                # Make the PUT request for interrupting the measurement
+                self.detectors.abort()
 
-            # Check if the request was successful 
-            if response.status_code // 100 == 2:
                 # Update the status in the GUI
                 self.update_status("Measurement aborted.")
-            else:
-                # If the request was not successful, update the status with an error message
-                self.update_status(f"Error aborting the measurement. Status code: {response.status_code}")
-        except Exception as e:
-            # Handle other exceptions or errors here
-            self.update_status(f"Error aborting the measurement: {str(e)}")
+            except Exception as e:
+                # Handle other exceptions or errors here
+                self.update_status(f"Error aborting the measurement: {str(e)}")
+
+        # Cancels everything queued and does not wait for the command in flight
+        self.run_command("abort", run, preempt=True)
 
     def perform_arm_trigger(self):
-        self.arm_detector()
+        try:
+            num_triggers = int(self.num_triggers_entry.get())
+        except ValueError:
+            num_triggers = 0
+
+        # A trigger series arms by itself, a separate arm before it would only be repeated
+        if num_triggers <= 0:
+            self.arm_detector()
         self.trigger_detector()
 
 
     def trigger_loop(self):
+        if self.trigger_scheduler is not None and self.trigger_scheduler.is_pending():
+            self.update_status("A trigger series is already running.")
+            return
+
         count_time = float(self.old_param_values.get('count_time', {}).get('value', 0))
-        url = f"http://{self.ip_address}/detector/api/1.8.0/config/nimages"
-        requests.put(url, json={"value": 1})
+        trigger_mode = self.old_param_values.get('trigger_mode', {}).get('value')
+
+        if self.series_mode_var.get() == "single_arm":
+            if trigger_mode not in SOFTWARE_TRIGGER_MODES:
+                self.update_status(f"Single arm series needs trigger mode ints or inte, not {trigger_mode}.")
+                return
+
+            # Configure and arm once for the whole series, disarm once at the end
+            def setup():
+                self.detectors.arm_series(self.num_triggers)
+                self.call_in_ui(self.show_series_config, self.num_triggers)
+
+            def fire(index):
+                self.detectors.trigger(trigger_mode, count_time)
+
+            def teardown():
+                self.detectors.disarm()
+        else:
+            # One trigger per arm, configured once instead of before every trigger
+            def setup():
+                self.detectors.configure_series(1)
+                self.call_in_ui(self.show_series_config, 1)
 
-        for _ in range(self.num_triggers):
-            requests.put(url, json={"value": 1})
-            self.perform_arm_trigger()
+            def fire(index):
+                self.detectors.arm()
+                self.detectors.trigger()
 
-            self.update_status("Trigger command sent.")
-            print(self.pause_between_triggers + count_time)
-            time.sleep(self.pause_between_triggers + count_time)
+            teardown = None
+
+        def on_progress(index, stats):
+            self.call_in_ui(self.update_status, f"Trigger {index + 1}/{self.num_triggers} sent.")
+
+        def on_done(stats, error):
+            if error is not None:
+                self.call_in_ui(self.update_status, f"Trigger series stopped: {error}")
+            elif scheduler.cancelled.is_set():
+                self.call_in_ui(self.update_status, f"Trigger series aborted after {stats}")
+            else:
+                self.call_in_ui(self.update_status, f"Trigger series done: {stats}")
+
+        # Runs off the Tk thread, so the window and the Abort button stay responsive
+        scheduler = TriggerScheduler(self.detectors, self.num_triggers, self.pause_between_triggers + count_time,
+                                     fire, pause=self.pause_between_triggers,
+                                     wait_for_idle=self.wait_for_idle_var.get(),
+                                     setup=setup, teardown=teardown, on_progress=on_progress, on_done=on_done)
+        self.trigger_scheduler = scheduler
+
+        # Queued like every other command, so it starts after a preceding arm or configuration
+        def run():
+            if not scheduler.cancelled.is_set():
+                scheduler.start()
+                self.update_status("Trigger series started.")
+
+        self.run_command("trigger", run)
+
+    def show_series_config(self, num_triggers):
+        for param, value in (("ntrigger", num_triggers), ("nimages", 1)):
+            value_type = self.old_param_values.get(param, {}).get("value_type", "uint")
+            self.show_param_value(param, {"value": str(value), "value_type": value_type})
 
     def disarm(self):
-        try:
-            # Construct the URL for disarming the detector
-            url = f"http://{self.ip_address}/detector/api/1.8.0/command/disarm"
+        if self.trigger_scheduler is not None:
+            self.trigger_scheduler.cancel()
 
-            # Make the PUT request for disarming the detector
-            response = requests.put(url)
+        def run():
+            try:
+                # Make the PUT request for disarming the detector
+                self.detectors.disarm()
 
-            # Check if the request was successful 
-            if response.status_code // 100 == 2:
                 # Update the status in the GUI
                 self.update_status("Detector disarmed.")
-            else:
-                # If the request was not successful, update the status with an error message
-                self.update_status(f"Error disarming the detector. Status code: {response.status_code}")
-        except Exception as e:
-            # Handle other exceptions or errors here
-            self.update_status(f"Error disarming the detector: {str(e)}")
+            except Exception as e:
+                # Handle other exceptions or errors here
+                self.update_status(f"Error disarming the detector: {str(e)}")
+
+        self.run_command("disarm", run, preempt=True)
 
     def update_status(self, text):
+        # Callable from worker threads, the label itself is only touched on the Tk thread
+        if threading.current_thread() is not threading.main_thread():
+            self.call_in_ui(self.update_status, text)
+            return
         self.status_label.config(text="Status: " + text)
 
-    def check_detector_status(self):
-        # method to check if the detector is measuring or not
-        status_url = f"http://{self.ip_address}/detector/api/1.8.0/status/state"
-        try:
-            response = requests.get(status_url)
-            if response.status_code == 200:
-                status_data = response.json()
-                detector_state = status_data.get("value", "unknown")
-                
-                if detector_state.lower() == 'acquire':
-                    self.update_status("Detector is measuring.")
-                else:
-                    self.update_status("Detector is not measuring.")
-            else:
-                self.update_status("Error fetching detector status.")
-        except Exception as e:
-            self.update_status(f"Error: {e}")
+    def run_command(self, name, func, preempt=False, cancellable=True):
+        self.commands.submit(name, func, preempt=preempt, cancellable=cancellable)
+
+    def show_command_state(self, name, state):
+        if state == "queued":
+            self.queued_commands[name] += 1
+        elif state == "running":
+            # Preempting commands run without being queued first
+            if self.queued_commands[name] > 0:
+                self.queued_commands[name] -= 1
+            self.running_commands[name] += 1
+        elif state == "done":
+            self.running_commands[name] -= 1
+        elif state == "cancelled":
+            self.queued_commands[name] -= 1
+            self.update_status(f"Cancelled: {name.replace('_', ' ')}")
+
+        # Mark buttons with a command in flight, a button can serve several commands
+        for button in self.command_buttons.get(name, []):
+            busy = any(self.queued_commands[other] > 0 or self.running_commands[other] > 0
+                       for other in self.button_commands[button])
+            text = self.button_texts[button]
+            button.config(text=f"{text} ..." if busy else text)
+
+    def show_command_error(self, name, error):
+        self.update_status(f"Error in {name.replace('_', ' ')}: {str(error)}")
 
     def refresh_status(self):
-
-        self.check_detector_status()
-        # Schedule the next status update (1000 milliseconds is just an example) 
-        self.after(1000, self.refresh_status)
+        # Poll the status keys in the background, widgets are only touched when a value changes
+        self.status_monitor = StatusMonitor(self.client, self.status_keys,
+                                            on_change=lambda key, value: self.call_in_ui(self.show_status_value, key, value))
+        self.status_monitor.start()
+
+        # With several detectors, the state of each one
+        self.detector_monitors = []
+        if len(self.detectors) > 1:
+            for client in self.detectors.clients:
+                monitor = StatusMonitor(client, [("detector", "state")],
+                                        on_change=lambda key, value, address=client.ip_address:
+                                        self.call_in_ui(self.show_detector_value, address, "state", value))
+                monitor.start()
+                self.detector_monitors.append(monitor)
+
+    @staticmethod
+    def status_text(key, value):
+        subsystem, name = key
+        return f"{subsystem.title()} {name.replace('_', ' ').title()}: {value}"
+
+    def show_status_value(self, key, value):
+        self.status_value_labels[key].config(text=self.status_text(key, "error" if value is None else value))
+
+    def show_detector_value(self, address, name, value):
+        label = self.detector_labels.get((address, name))
+        if label is not None:
+            label.config(text="error" if value is None else value)
+
+    def show_detector_result(self, result):
+        if len(self.detectors) == 1 or result.name not in DETECTOR_TIMINGS:
+            return
+
+        for address, elapsed in result.elapsed.items():
+            text = f"{elapsed * 1000:.1f}"
+            if address in result.errors:
+                text += " (error)"
+            self.show_detector_value(address, result.name, text)
+
+        self.skew_label.config(text=f"Last {result.name.replace('_', ' ')}: sent within {result.send_skew * 1000:.1f} ms, "
+                                    f"answered within {result.done_skew * 1000:.1f} ms")
 
 
 def create_gui(ip_address, root_conn):
+    addresses = parse_addresses(ip_address)
+    if not addresses:
+        return
     root_conn.destroy()
     root_main = tk.Tk()
-    DEigerGUI(root_main, ip_address)
+    DEigerGUI(root_main, addresses if len(addresses) > 1 else addresses[0])
     root_main.mainloop()
 
 
@@ -0,0 +1,182 @@
+import statistics
+import threading
+import time
+
+
+# Trigger modes in which the detector is triggered by command/trigger
+SOFTWARE_TRIGGER_MODES = ("ints", "inte")
+
+
+class TriggerStats:
+    """Timing of a finished trigger series, measured on the monotonic clock."""
+
+    def __init__(self, scheduled, fired):
+        self.scheduled = scheduled
+        self.fired = fired
+
+    @property
+    def count(self):
+        return len(self.fired)
+
+    @property
+    def intervals(self):
+        return [b - a for a, b in zip(self.fired, self.fired[1:])]
+
+    @property
+    def period(self):
+        intervals = self.intervals
+        return statistics.mean(intervals) if intervals else 0.0
+
+    @property
+    def jitter(self):
+        # Standard deviation of the achieved trigger period
+        intervals = self.intervals
+        return statistics.pstdev(intervals) if len(intervals) > 1 else 0.0
+
+    @property
+    def max_lateness(self):
+        # Worst delay of a trigger behind its scheduled time
+        return max((f - s for s, f in zip(self.scheduled, self.fired)), default=0.0)
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "period": self.period,
+            "jitter": self.jitter,
+            "max_lateness": self.max_lateness,
+        }
+
+    def __str__(self):
+        return (f"{self.count} triggers, period {self.period:.3f} s, "
+                f"jitter {self.jitter * 1000:.1f} ms, max lateness {self.max_lateness * 1000:.1f} ms")
+
+
+class TriggerScheduler:
+    """Runs a trigger series on a background thread.
+
+    Trigger i is fired at start + i * period on the monotonic clock, so the
+    time spent in HTTP requests does not accumulate into drift. With
+    wait_for_idle the scheduler also polls status/state after every trigger
+    and does not fire the next one before the detector has left 'acquire'
+    and the pause has elapsed. cancel() stops the series immediately, also in
+    the middle of a wait.
+
+    fire(index) does the per-trigger work and runs on the scheduler thread.
+    The optional setup() runs there once before the first trigger and
+    teardown() once after the last one, also when the series was cancelled
+    or failed. on_progress(index, stats) and on_done(stats, error) are called from the
+    scheduler thread too, GUIs have to marshal them to their own thread.
+    """
+
+    def __init__(self, client, num_triggers, period, fire, pause=0.0, wait_for_idle=False,
+                 poll_interval=0.02, setup=None, teardown=None, on_progress=None, on_done=None):
+        self.client = client
+        self.num_triggers = num_triggers
+        self.period = period
+        self.fire = fire
+        self.setup = setup
+        self.teardown = teardown
+        self.pause = pause
+        self.wait_for_idle = wait_for_idle
+        self.poll_interval = poll_interval
+        self.on_progress = on_progress
+        self.on_done = on_done
+
+        self.cancelled = threading.Event()
+        self.thread = None
+        self.stats = TriggerStats([], [])
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def is_pending(self):
+        # Running, or created and neither started nor cancelled yet
+        if self.thread is None:
+            return not self.cancelled.is_set()
+        return self.thread.is_alive()
+
+    def join(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def wait_until(self, deadline):
+        # Returns False if the series was cancelled while waiting
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            return not self.cancelled.wait(remaining)
+        return not self.cancelled.is_set()
+
+    def wait_while_acquiring(self):
+        while not self.cancelled.is_set():
+            state = self.client.detector_status("state").get("value", "unknown")
+            if state.lower() != "acquire":
+                return True
+            self.cancelled.wait(self.poll_interval)
+        return False
+
+    def run(self):
+        error = None
+
+        try:
+            if self.setup is not None:
+                self.setup()
+            self.run_triggers()
+        except Exception as e:
+            error = e
+
+        if self.teardown is not None:
+            try:
+                self.teardown()
+            except Exception as e:
+                error = error or e
+
+        if self.on_done is not None:
+            self.on_done(self.stats, error)
+
+    def run_triggers(self):
+        start = time.monotonic()
+        next_time = start
+
+        for index in range(self.num_triggers):
+            if not self.wait_until(next_time):
+                break
+
+            self.stats.scheduled.append(next_time)
+            self.stats.fired.append(time.monotonic())
+            self.fire(index)
+
+            if self.on_progress is not None:
+                self.on_progress(index, self.stats)
+
+            next_time = start + (index + 1) * self.period
+            if self.wait_for_idle:
+                if not self.wait_while_acquiring():
+                    break
+                next_time = max(next_time, time.monotonic() + self.pause)
+
+
+def configure_series(client, num_triggers, nimages=1):
+    # One arm covers the whole series, every trigger records nimages images
+    changed = set(client.set_detector_config("ntrigger", num_triggers))
+    changed.update(client.set_detector_config("nimages", nimages))
+    return changed
+
+
+def arm_series(client, num_triggers, nimages=1):
+    changed = configure_series(client, num_triggers, nimages)
+    client.detector_command("arm")
+    return changed
+
+
+def send_trigger(client, trigger_mode, count_time=None):
+    # In inte mode the trigger command carries the exposure time of that trigger
+    if trigger_mode == "inte":
+        return client.detector_command("trigger", count_time)
+    return client.detector_command("trigger")
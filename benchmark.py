@@ -0,0 +1,168 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from acquisition import TriggerScheduler, arm_series, configure_series
+from simplon import SimplonClient, apply_configs, config_params, fetch_configs
+from simulator import SimplonSimulator
+
+
+def summary(samples):
+    # Latency summary in seconds of a list of samples
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean": statistics.mean(ordered),
+        "min": ordered[0],
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+    }
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summary(samples)
+
+
+def bench_connect_to_window(address, timeout=30.0):
+    # Time from creating the window until every parameter entry is filled in
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:
+        return {"skipped": f"no display: {e}"}
+
+    from EigerGUI import DEigerGUI
+
+    # A fresh snapshot cache, otherwise the form would be filled from a previous run
+    cache_path = os.path.join(tempfile.mkdtemp(), "config_cache.json")
+
+    start = time.perf_counter()
+    gui = DEigerGUI(root, address, cache_path=cache_path)
+    root.update()
+    window_time = time.perf_counter() - start
+
+    while len(gui.fetched_data) < len(config_params) and time.perf_counter() - start < timeout:
+        root.update()
+        time.sleep(0.001)
+    filled_time = time.perf_counter() - start
+
+    gui.status_monitor.stop()
+    root.destroy()
+    return {"window": window_time, "all_parameters": filled_time}
+
+
+def bench_fetch_config(client, keys, repeat, max_workers):
+    return timed(lambda: fetch_configs(client, keys, max_workers=max_workers), repeat)
+
+
+def bench_set_configuration(client, repeat, max_workers):
+    # A multi-field change with side effects, alternating so every apply really changes something
+    changes = [
+        {"photon_energy": 9000.0, "count_time": 0.1, "frame_time": 0.1, "nimages": 2},
+        {"photon_energy": 8041.0, "count_time": 0.5, "frame_time": 0.5, "nimages": 1},
+    ]
+    index = [0]
+
+    def apply():
+        apply_configs(client, changes[index[0] % 2], max_workers=max_workers)
+        index[0] += 1
+
+    return timed(apply, repeat)
+
+
+def bench_arm_trigger(client, repeat):
+    configure_series(client, 1)
+    arm_samples = []
+    trigger_samples = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        client.detector_command("arm")
+        armed = time.perf_counter()
+        client.detector_command("trigger")
+        arm_samples.append(armed - start)
+        trigger_samples.append(time.perf_counter() - armed)
+        client.detector_command("disarm")
+
+    return {"arm": summary(arm_samples), "trigger": summary(trigger_samples)}
+
+
+def bench_trigger_loop(client, num_triggers, period):
+    results = {}
+
+    # The re-arm mode of DEigerGUI.trigger_loop
+    def fire_rearm(index):
+        client.detector_command("arm")
+        client.detector_command("trigger")
+
+    scheduler = TriggerScheduler(client, num_triggers, period, fire_rearm, setup=lambda: configure_series(client, 1))
+    scheduler.run()
+    results["rearm"] = scheduler.stats.as_dict()
+
+    # The single arm mode
+    scheduler = TriggerScheduler(client, num_triggers, period, lambda index: client.detector_command("trigger"),
+                                 setup=lambda: arm_series(client, num_triggers),
+                                 teardown=lambda: client.detector_command("disarm"))
+    scheduler.run()
+    results["single_arm"] = scheduler.stats.as_dict()
+
+    for mode in results:
+        results[mode]["target_period"] = period
+    return results
+
+
+def run(latency=0.002, arm_time=0.05, repeat=20, num_triggers=50, period=0.0, max_workers=8, gui=True):
+    simulator = SimplonSimulator(latency=latency, arm_time=arm_time).start()
+    client = SimplonClient(simulator.address)
+
+    try:
+        results = {
+            "fetch_config": bench_fetch_config(client, config_params, repeat, max_workers),
+            "set_configuration": bench_set_configuration(client, repeat, max_workers),
+            "arm_trigger": bench_arm_trigger(client, repeat),
+            "trigger_loop": bench_trigger_loop(client, num_triggers, period),
+        }
+        if gui:
+            results["connect_to_window"] = bench_connect_to_window(simulator.address)
+        results["requests"] = client.stats.snapshot(by_section=True)
+    finally:
+        client.close()
+        simulator.stop()
+
+    return {
+        "settings": {"latency": latency, "arm_time": arm_time, "repeat": repeat, "num_triggers": num_triggers,
+                     "period": period, "max_workers": max_workers},
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of the GUI against the Simplon simulator")
+    parser.add_argument("--latency", type=float, default=0.002, help="seconds the simulator adds to every request")
+    parser.add_argument("--arm-time", type=float, default=0.05, help="seconds an arm takes")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--triggers", type=int, default=50, help="triggers per trigger_loop series")
+    parser.add_argument("--period", type=float, default=0.0, help="target trigger period in seconds")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent requests when fetching")
+    parser.add_argument("--no-gui", action="store_true", help="skip the connect-to-window measurement")
+    parser.add_argument("--output", help="write the results to this JSON file instead of stdout")
+    args = parser.parse_args()
+
+    report = run(args.latency, args.arm_time, args.repeat, args.triggers, args.period, args.workers, not args.no_gui)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
@@ -0,0 +1,84 @@
+import collections
+import threading
+
+
+class CommandExecutor:
+    """Runs GUI commands on a worker thread, one after the other.
+
+    Submitting a command under a name that is still pending replaces the
+    pending one in its place in the queue, so repeated clicks coalesce and
+    the latest arguments win. A preempting command (abort, disarm) cancels
+    everything pending and runs at once on its own thread, without waiting
+    for the command in flight. Commands submitted with cancellable=False
+    stay queued through a preemption.
+
+    post(func, *args) has to run func on the GUI thread, on_state(name,
+    state) and on_error(name, error) are delivered through it. The states
+    are "queued", "running", "done" and "cancelled".
+    """
+
+    def __init__(self, post, on_state=None, on_error=None):
+        self.post = post
+        self.on_state = on_state
+        self.on_error = on_error
+
+        self.pending = collections.OrderedDict()
+        self.condition = threading.Condition()
+        self.stopped = False
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, name, func, *args, preempt=False, cancellable=True):
+        if preempt:
+            self.cancel_pending()
+            threading.Thread(target=self.execute, args=(name, func, args), daemon=True).start()
+            return
+
+        with self.condition:
+            coalesced = name in self.pending
+            # Assigning an existing key keeps its position in the queue
+            self.pending[name] = (func, args, cancellable)
+            self.condition.notify()
+
+        if not coalesced:
+            self.notify(name, "queued")
+
+    def cancel_pending(self):
+        with self.condition:
+            cancelled = [name for name, (_, _, cancellable) in self.pending.items() if cancellable]
+            for name in cancelled:
+                del self.pending[name]
+
+        for name in cancelled:
+            self.notify(name, "cancelled")
+        return cancelled
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def notify(self, name, state):
+        if self.on_state is not None:
+            self.post(self.on_state, name, state)
+
+    def execute(self, name, func, args):
+        self.notify(name, "running")
+        try:
+            func(*args)
+        except Exception as e:
+            if self.on_error is not None:
+                self.post(self.on_error, name, e)
+        self.notify(name, "done")
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                name, (func, args, _) = self.pending.popitem(last=False)
+
+            self.execute(name, func, args)
@@ -0,0 +1,60 @@
+import json
+import os
+import re
+import time
+
+
+# Default location of the per-DCU configuration snapshots
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".eigergui", "config_cache")
+
+
+class ConfigCache(dict):
+    """On-disk snapshot of the detector configuration of one DCU.
+
+    Maps each config key to {"value", "value_type", "timestamp"}, where value
+    is kept as the string shown in the GUI and timestamp is the time.time()
+    of the last fetch or successful PUT. The snapshot is written with
+    save() and read back with ConfigCache.load() on the next start.
+    """
+
+    def __init__(self, ip_address, path=None, entries=None):
+        super().__init__(entries or {})
+        self.ip_address = ip_address
+        self.path = path or self.default_path(ip_address)
+
+    @staticmethod
+    def default_path(ip_address):
+        # One file per DCU address, keep the file name portable
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", ip_address) or "default"
+        return os.path.join(CACHE_DIR, f"{name}.json")
+
+    @classmethod
+    def load(cls, ip_address, path=None):
+        cache = cls(ip_address, path)
+        try:
+            with open(cache.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            # No snapshot yet or an unreadable one, start empty
+            return cache
+
+        if data.get("ip_address") == ip_address:
+            cache.update(data.get("params", {}))
+        return cache
+
+    def save(self):
+        data = {"ip_address": self.ip_address, "params": dict(self)}
+
+        # Write to a temporary file first, so a crash never leaves half a snapshot
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def set_value(self, key, value, value_type, timestamp=None):
+        self[key] = {
+            "value": str(value),
+            "value_type": value_type,
+            "timestamp": time.time() if timestamp is None else timestamp,
+        }
@@ -0,0 +1,180 @@
+import re
+import threading
+import time
+
+from acquisition import configure_series, send_trigger
+from simplon import SimplonError, apply_configs
+
+
+def parse_addresses(text):
+    # "10.0.0.1, 10.0.0.2 10.0.0.3" -> ["10.0.0.1", "10.0.0.2", "10.0.0.3"], duplicates dropped
+    addresses = []
+    for address in re.split(r"[,;\s]+", text.strip()):
+        if address and address not in addresses:
+            addresses.append(address)
+    return addresses
+
+
+class GroupError(SimplonError):
+    def __init__(self, result):
+        errors = ", ".join(f"{address}: {error}" for address, error in result.errors.items())
+        super().__init__(f"{result.name} failed on {len(result.errors)} of {len(result.elapsed)} detectors ({errors})")
+        self.result = result
+
+
+class FanOutResult:
+    def __init__(self, name):
+        self.name = name
+        self.results = {}     # address -> return value
+        self.errors = {}      # address -> exception
+        self.elapsed = {}     # address -> seconds of the request
+        self.send_skew = 0.0  # spread of the times the requests were sent
+        self.done_skew = 0.0  # spread of the times the detectors answered
+
+
+class DetectorGroup:
+    """Sends the same Simplon operation to several detectors at once.
+
+    Every operation runs on one thread per detector. For arm, trigger,
+    disarm and abort the threads meet at a barrier first, so the requests
+    leave together instead of one after the other. arm() returns only when
+    every detector answered its arm; if one of them fails, the ones that
+    did arm are disarmed again. The arm of every detector is tracked, and
+    trigger() refuses to run unless all of them are armed.
+
+    The first client is the primary detector, the one the GUI shows the
+    configuration of. on_result(result) is called from a worker thread
+    with the FanOutResult of every operation.
+    """
+
+    def __init__(self, clients, on_result=None):
+        self.clients = list(clients)
+        self.on_result = on_result
+        self.lock = threading.Lock()
+        self.armed = set()    # addresses of the detectors armed through this group
+
+    @property
+    def primary(self):
+        return self.clients[0]
+
+    @property
+    def addresses(self):
+        return [client.ip_address for client in self.clients]
+
+    def __len__(self):
+        return len(self.clients)
+
+    def close(self):
+        for client in self.clients:
+            client.close()
+
+    def fan_out(self, name, func, *args, synchronized=False):
+        # func(client, *args) on every detector concurrently, raises GroupError if any failed
+        result = FanOutResult(name)
+        barrier = threading.Barrier(len(self.clients)) if synchronized and len(self.clients) > 1 else None
+        times = {}
+
+        def call(client):
+            if barrier is not None:
+                try:
+                    barrier.wait(timeout=5.0)
+                except threading.BrokenBarrierError:
+                    pass
+            start = time.perf_counter()
+            try:
+                value = func(client, *args)
+            except (SimplonError, ValueError) as e:
+                result.errors[client.ip_address] = e
+            else:
+                result.results[client.ip_address] = value
+            end = time.perf_counter()
+            result.elapsed[client.ip_address] = end - start
+            times[client.ip_address] = (start, end)
+
+        if len(self.clients) == 1:
+            call(self.primary)
+        else:
+            threads = [threading.Thread(target=call, args=(client,), daemon=True) for client in self.clients]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        starts, ends = zip(*times.values())
+        result.send_skew = max(starts) - min(starts)
+        result.done_skew = max(ends) - min(ends)
+
+        if self.on_result is not None:
+            self.on_result(result)
+        if result.errors:
+            # A single detector keeps its own error message
+            if len(self.clients) == 1:
+                raise result.errors[self.primary.ip_address]
+            raise GroupError(result)
+        return result
+
+    def apply_configs(self, changes, subsystem="detector", refresh_keys=None, max_workers=8):
+        # Returns address -> ConfigApplyResult, a failing PUT is reported there and not raised
+        return self.fan_out("set_configuration", apply_configs, changes, subsystem, refresh_keys, max_workers).results
+
+    def configure_series(self, num_triggers, nimages=1):
+        return self.fan_out("configure_series", configure_series, num_triggers, nimages)
+
+    def arm(self):
+        with self.lock:
+            self.armed.clear()
+        try:
+            result = self.fan_out("arm", lambda client: client.detector_command("arm"), synchronized=True)
+        except GroupError as e:
+            # Never leave only a part of the modules armed
+            armed = set(e.result.results)
+            for client in self.clients:
+                if client.ip_address in e.result.results:
+                    try:
+                        client.detector_command("disarm")
+                    except SimplonError:
+                        continue
+                    armed.discard(client.ip_address)
+            with self.lock:
+                self.armed.update(armed)
+            raise
+
+        with self.lock:
+            self.armed.update(result.results)
+        return result
+
+    def arm_series(self, num_triggers, nimages=1):
+        self.configure_series(num_triggers, nimages)
+        return self.arm()
+
+    def trigger(self, trigger_mode=None, count_time=None):
+        with self.lock:
+            missing = [address for address in self.addresses if address not in self.armed]
+        if missing:
+            raise SimplonError(f"Not triggering, {', '.join(missing)} not armed")
+        return self.fan_out("trigger", send_trigger, trigger_mode, count_time, synchronized=True)
+
+    def disarm(self):
+        try:
+            return self.fan_out("disarm", lambda client: client.detector_command("disarm"), synchronized=True)
+        finally:
+            with self.lock:
+                self.armed.clear()
+
+    def abort(self):
+        try:
+            return self.fan_out("abort", lambda client: client.detector_command("abort"), synchronized=True)
+        finally:
+            with self.lock:
+                self.armed.clear()
+
+    def detector_status(self, key, timeout=None):
+        # Status of the group: "acquire" while any detector still acquires, else the primary's
+        if len(self.clients) == 1 or key != "state":
+            return self.primary.detector_status(key, timeout)
+
+        result = self.fan_out("state", lambda client: client.detector_status(key, timeout))
+        values = [data.get("value") for data in result.results.values()]
+        if "acquire" in values:
+            return {"value": "acquire"}
+        return result.results[self.primary.ip_address]
@@ -0,0 +1,192 @@
+import collections
+import json
+import os
+import threading
+import time
+
+
+# Upper bounds in seconds of the latency buckets, 10 per decade from 0.1 ms to 100 s
+BUCKET_BOUNDS = [1e-4 * 10 ** (index / 10) for index in range(61)]
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Non-2xx answers that are a normal result of an endpoint, not an error:
+# the monitor answers 404 or 408 when it has no image to send
+EXPECTED_STATUSES = {
+    "monitor/images/next": (404, 408),
+    "monitor/images/monitor": (404, 408),
+}
+
+
+class LatencyHistogram:
+    """Fixed log-spaced buckets, quantiles are interpolated within a bucket (about 12 % resolution)."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        low, high = 0, len(BUCKET_BOUNDS)
+        while low < high:
+            middle = (low + high) // 2
+            if BUCKET_BOUNDS[middle] < seconds:
+                low = middle + 1
+            else:
+                high = middle
+        self.counts[low] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = BUCKET_BOUNDS[index - 1] if index else 0.0
+                upper = BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max
+                value = lower + (upper - lower) * (rank - seen) / count
+                # The interpolation must not claim more than was actually measured
+                return min(value, self.max)
+            seen += count
+        return self.max
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self.bytes = 0
+        self.statuses = collections.Counter()
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.errors += other.errors
+        self.bytes += other.bytes
+        self.statuses.update(other.statuses)
+
+    def as_dict(self):
+        count = self.latency.count
+        result = {
+            "count": count,
+            "errors": self.errors,
+            "error_rate": self.errors / count if count else 0.0,
+            "bytes": self.bytes,
+            "total_time": self.latency.total,
+            "mean": self.latency.total / count if count else 0.0,
+            "max": self.latency.max,
+            "statuses": {str(status): n for status, n in sorted(self.statuses.items(), key=lambda item: str(item[0]))},
+        }
+        for q in QUANTILES:
+            result[f"p{int(q * 100)}"] = self.latency.quantile(q)
+        return result
+
+
+class RequestStats:
+    """Thread-safe record of every Simplon request, aggregated per (method, endpoint).
+
+    The endpoint is the API path without host and version, e.g.
+    detector/command/arm or detector/status/state; file transfers are all
+    counted under data. The last recent requests are also kept one by one.
+    A status of None is a request that got no response at all. Every
+    non-2xx status counts as an error except those in EXPECTED_STATUSES.
+    """
+
+    def __init__(self, recent=1000):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.recent = collections.deque(maxlen=recent)
+        self.start_time = time.time()
+
+    def record(self, method, endpoint, status, nbytes, elapsed):
+        with self.lock:
+            stats = self.endpoints.get((method, endpoint))
+            if stats is None:
+                stats = self.endpoints[(method, endpoint)] = EndpointStats()
+            stats.latency.add(elapsed)
+            stats.bytes += nbytes
+            stats.statuses[status] += 1
+            if is_error(endpoint, status):
+                stats.errors += 1
+            self.recent.append((time.time(), method, endpoint, status, nbytes, elapsed))
+
+    def reset(self):
+        with self.lock:
+            self.endpoints.clear()
+            self.recent.clear()
+            self.start_time = time.time()
+
+    def snapshot(self, by_section=False):
+        # List of per-endpoint dicts, the endpoints with the most total time first.
+        # by_section merges the keys, e.g. all of detector/config into one row.
+        with self.lock:
+            if by_section:
+                groups = {}
+                for (method, endpoint), stats in self.endpoints.items():
+                    key = (method, "/".join(endpoint.split("/")[:2]))
+                    groups.setdefault(key, EndpointStats()).merge(stats)
+            else:
+                groups = self.endpoints
+            rows = [dict(stats.as_dict(), method=method, endpoint=endpoint)
+                    for (method, endpoint), stats in groups.items()]
+        return sorted(rows, key=lambda row: row["total_time"], reverse=True)
+
+    def to_json(self):
+        with self.lock:
+            recent = [{"time": t, "method": method, "endpoint": endpoint, "status": status, "bytes": nbytes,
+                       "elapsed": elapsed} for t, method, endpoint, status, nbytes, elapsed in self.recent]
+        report = {"start_time": self.start_time, "end_time": time.time(), "endpoints": self.snapshot(),
+                  "recent": recent}
+        return json.dumps(report, indent=2)
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP eigergui_request_duration_seconds Wall time of Simplon API requests.",
+            "# TYPE eigergui_request_duration_seconds summary",
+        ]
+        counters = []
+        for row in self.snapshot():
+            labels = f'endpoint="{escape_label(row["endpoint"])}",method="{row["method"]}"'
+            for q in QUANTILES:
+                lines.append(f'eigergui_request_duration_seconds{{{labels},quantile="{q}"}} {row[f"p{int(q * 100)}"]}')
+            lines.append(f"eigergui_request_duration_seconds_sum{{{labels}}} {row['total_time']}")
+            lines.append(f"eigergui_request_duration_seconds_count{{{labels}}} {row['count']}")
+            counters.append((labels, row))
+
+        for name, field, text in (("request_errors_total", "errors", "Failed Simplon API requests."),
+                                  ("response_bytes_total", "bytes", "Bytes received from the Simplon API.")):
+            lines.append(f"# HELP eigergui_{name} {text}")
+            lines.append(f"# TYPE eigergui_{name} counter")
+            for labels, row in counters:
+                lines.append(f"eigergui_{name}{{{labels}}} {row[field]}")
+
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        # Prometheus textfile for .prom, JSON otherwise; written atomically for the textfile collector
+        text = self.to_prometheus() if path.endswith(".prom") else self.to_json()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+def is_error(endpoint, status):
+    if status is None:
+        return True
+    return status // 100 != 2 and status not in EXPECTED_STATUSES.get(endpoint, ())
+
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,125 @@
+import tkinter as tk
+from tkinter import filedialog
+from tkinter import ttk
+
+
+COLUMNS = (
+    ("endpoint", "Endpoint", 240),
+    ("method", "Method", 60),
+    ("count", "Count", 60),
+    ("error_rate", "Errors", 60),
+    ("p50", "p50 ms", 70),
+    ("p95", "p95 ms", 70),
+    ("p99", "p99 ms", 70),
+    ("max", "Max ms", 70),
+    ("total_time", "Total s", 70),
+    ("bytes", "kB", 70),
+)
+
+
+def format_cell(column, value):
+    if column in ("p50", "p95", "p99", "max"):
+        return f"{value * 1000:.1f}"
+    if column == "total_time":
+        return f"{value:.2f}"
+    if column == "error_rate":
+        return f"{value * 100:.1f} %"
+    if column == "bytes":
+        return f"{value / 1000:.1f}"
+    return str(value)
+
+
+class DiagnosticsView:
+    """Tk panel with the request latencies of a diagnostics.RequestStats.
+
+    The table is refreshed every refresh_interval ms, the endpoints that
+    took the most time in total are listed first. on_status(text) reports
+    the result of an export.
+    """
+
+    def __init__(self, parent, stats, refresh_interval=1000, on_status=None):
+        self.parent = parent
+        self.stats = stats
+        self.refresh_interval = refresh_interval
+        self.on_status = on_status
+        self.after_id = None
+
+        self.create_widgets()
+        self.refresh()
+
+    def create_widgets(self):
+        self.frame = ttk.Frame(self.parent)
+        self.frame.pack(fill="both", expand="yes", padx=10, pady=10)
+
+        self.table = ttk.Treeview(self.frame, columns=[column for column, _, _ in COLUMNS], show="headings",
+                                  height=20)
+        for column, heading, width in COLUMNS:
+            self.table.heading(column, text=heading)
+            self.table.column(column, width=width, anchor=tk.W if column == "endpoint" else tk.E)
+        self.table.grid(row=0, column=0, columnspan=5, padx=5, pady=5, sticky="nsew")
+
+        scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.table.yview)
+        scrollbar.grid(row=0, column=5, sticky="ns")
+        self.table.configure(yscrollcommand=scrollbar.set)
+
+        self.by_section_var = tk.BooleanVar(value=False)
+        self.by_section_check = ttk.Checkbutton(self.frame, text="Group by Section", variable=self.by_section_var,
+                                                command=self.refresh_table)
+        self.by_section_check.grid(row=1, column=0, padx=5, pady=5, sticky=tk.W)
+
+        self.reset_button = ttk.Button(self.frame, text="Reset", command=self.reset)
+        self.reset_button.grid(row=1, column=1, padx=5, pady=5)
+
+        self.export_json_button = ttk.Button(self.frame, text="Export JSON",
+                                             command=lambda: self.export(".json", "JSON", "*.json"))
+        self.export_json_button.grid(row=1, column=2, padx=5, pady=5)
+
+        self.export_prometheus_button = ttk.Button(self.frame, text="Export Prometheus",
+                                                   command=lambda: self.export(".prom", "Prometheus textfile", "*.prom"))
+        self.export_prometheus_button.grid(row=1, column=3, padx=5, pady=5)
+
+        self.summary_label = ttk.Label(self.frame, text="")
+        self.summary_label.grid(row=1, column=4, padx=5, pady=5, sticky=tk.W)
+
+        self.frame.rowconfigure(0, weight=1)
+        self.frame.columnconfigure(4, weight=1)
+
+    def refresh_table(self):
+        rows = self.stats.snapshot(self.by_section_var.get())
+
+        self.table.delete(*self.table.get_children())
+        for row in rows:
+            self.table.insert("", tk.END, values=[format_cell(column, row[column]) for column, _, _ in COLUMNS])
+
+        count = sum(row["count"] for row in rows)
+        errors = sum(row["errors"] for row in rows)
+        self.summary_label.config(text=f"{count} requests, {errors} errors")
+
+    def refresh(self):
+        self.refresh_table()
+        self.after_id = self.parent.after(self.refresh_interval, self.refresh)
+
+    def reset(self):
+        self.stats.reset()
+        self.refresh_table()
+
+    def export(self, extension, description, pattern):
+        path = filedialog.asksaveasfilename(parent=self.parent, defaultextension=extension,
+                                            filetypes=[(description, pattern)])
+        if not path:
+            return
+        try:
+            self.stats.export(path)
+        except OSError as e:
+            self.report(f"Export failed: {e}")
+            return
+        self.report(f"Request statistics written to {path}")
+
+    def report(self, text):
+        if self.on_status is not None:
+            self.on_status(text)
+
+    def stop(self):
+        if self.after_id is not None:
+            self.parent.after_cancel(self.after_id)
+            self.after_id = None
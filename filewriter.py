@@ -0,0 +1,197 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from simplon import SimplonError
+
+
+class DownloadStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.files = 0
+        self.bytes = 0
+        self.errors = 0
+        self.start_time = time.monotonic()
+
+    def add(self, nbytes, files=0):
+        with self.lock:
+            self.bytes += nbytes
+            self.files += files
+
+    def add_error(self):
+        with self.lock:
+            self.errors += 1
+
+    def rate(self):
+        # Average MB/s since the downloader was started
+        return self.bytes / max(time.monotonic() - self.start_time, 1e-9) / 1e6
+
+
+class FilewriterDownloader:
+    """Moves the files written by the filewriter from the DCU to a local directory.
+
+    Every interval seconds the file list of the DCU is checked. A file is
+    downloaded once its size has not changed since the previous check, so
+    files still being written are left alone. Downloads run in parallel,
+    are written in chunks to <name>.part and resume from there after an
+    interruption, as long as the file is still on the DCU; a .part file
+    this downloader did not write is started over. Only after the local
+    size matches the size on the DCU the file is renamed and, if delete is
+    set, deleted on the DCU. A file whose name already exists locally is
+    never overwritten: it is reported and kept on the DCU. A file kept on
+    the DCU is handled once, it is only looked at again after it was gone
+    from the file list.
+
+    on_file(name, size) and on_error(name, error) are called from worker threads.
+    """
+
+    def __init__(self, client, directory, workers=4, interval=2.0, delete=True, chunk_size=1 << 20,
+                 on_file=None, on_error=None):
+        self.client = client
+        self.directory = os.path.abspath(directory)
+        self.workers = workers
+        self.interval = interval
+        self.delete = delete
+        self.chunk_size = chunk_size
+        self.on_file = on_file
+        self.on_error = on_error
+
+        self.sizes = {}       # name -> size seen at the previous check
+        self.active = set()   # names being downloaded
+        self.completed = {}   # name -> size of the finished download, for files kept on the DCU
+        self.refused = {}     # name -> size of the files kept on the DCU because the name exists locally
+        self.partial = {}     # name -> size of the DCU file the .part file was written for
+        self.lock = threading.Lock()
+        self.stats = DownloadStats()
+
+        self.stopped = threading.Event()
+        self.thread = None
+        self.executor = None
+
+    def start(self):
+        self.stopped.clear()
+        self.stats = DownloadStats()
+        self.executor = ThreadPoolExecutor(self.workers)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        # Running downloads stop after their current chunk and resume on the next start
+        self.stopped.set()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.poll()
+            except SimplonError as e:
+                self.report_error(None, e)
+            self.stopped.wait(self.interval)
+
+        self.executor.shutdown(wait=True)
+
+    def poll(self):
+        names = self.client.filewriter_files()
+
+        for name in names:
+            with self.lock:
+                if name in self.active or name in self.completed or name in self.refused:
+                    continue
+
+            size = self.client.data_file_size(name)
+            if size >= 0 and self.sizes.get(name) == size:
+                with self.lock:
+                    self.active.add(name)
+                self.executor.submit(self.download, name, size)
+            self.sizes[name] = size
+
+        # Forget files which disappeared from the DCU
+        for name in set(self.sizes) - set(names):
+            del self.sizes[name]
+        with self.lock:
+            for handled in (self.completed, self.refused, self.partial):
+                for name in set(handled) - set(names):
+                    del handled[name]
+
+    def local_path(self, name):
+        path = os.path.normpath(os.path.join(self.directory, name))
+        if not path.startswith(self.directory + os.sep):
+            raise ValueError(f"Refusing to write {name} outside of {self.directory}")
+        return path
+
+    def download(self, name, size):
+        try:
+            path = self.local_path(name)
+            if os.path.exists(path):
+                # Maybe another series written under the same name, the DCU copy is the only one of it
+                with self.lock:
+                    self.refused[name] = size
+                raise FileExistsError(f"{path} already exists, {name} is kept on the DCU")
+            if not self.transfer(name, size, path):
+                return
+
+            if self.delete:
+                self.client.delete_data_file(name)
+                self.sizes.pop(name, None)
+            else:
+                with self.lock:
+                    self.completed[name] = size
+
+            self.stats.add(0, files=1)
+            if self.on_file is not None:
+                self.on_file(name, size)
+        except (SimplonError, OSError, ValueError) as e:
+            self.report_error(name, e)
+        finally:
+            with self.lock:
+                self.active.discard(name)
+
+    def transfer(self, name, size, path):
+        # Returns True once the complete file is in place, False if stopped before
+        part_path = f"{path}.part"
+        os.makedirs(os.path.dirname(part_path), exist_ok=True)
+
+        # Only a .part file written for this very file on the DCU is resumed
+        with self.lock:
+            resume = self.partial.get(name) == size
+            self.partial[name] = size
+        offset = os.path.getsize(part_path) if resume and os.path.exists(part_path) else 0
+        if offset > size:
+            offset = 0
+        elif offset == size:
+            # Interrupted after the last chunk, a range starting at the end would be answered with 416
+            os.replace(part_path, path)
+            with self.lock:
+                self.partial.pop(name, None)
+            return True
+
+        with self.client.open_data_file(name, offset) as response:
+            # A 200 instead of 206 means the DCU ignored the range, start over
+            if response.status_code != 206:
+                offset = 0
+
+            with open(part_path, "r+b" if offset else "wb") as f:
+                f.seek(offset)
+                f.truncate()
+                for chunk in response.iter_content(self.chunk_size):
+                    if self.stopped.is_set():
+                        return False
+                    f.write(chunk)
+                    self.stats.add(len(chunk))
+
+        local_size = os.path.getsize(part_path)
+        if local_size != size:
+            raise OSError(f"Size mismatch for {name}: {local_size} bytes downloaded, {size} expected")
+
+        os.replace(part_path, path)
+        with self.lock:
+            self.partial.pop(name, None)
+        return True
+
+    def report_error(self, name, error):
+        self.stats.add_error()
+        if self.on_error is not None:
+            self.on_error(name, error)
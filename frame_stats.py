@@ -0,0 +1,329 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# Columns of every statistics row, followed by one roi_<name> column per ROI
+BASE_FIELDS = [("number", "<i8"), ("time", "<f8"), ("total", "<i8"), ("max", "<i8"), ("saturated", "<i8"),
+               ("hot", "<i8"), ("masked", "<i8")]
+
+
+def parse_rois(text):
+    # "beam:200:300:400:520; edge:0:512:0:20" -> {"beam": (200, 300, 400, 520), ...} as y0:y1:x0:x1
+    rois = {}
+    for part in text.replace(",", ";").split(";"):
+        part = part.strip()
+        if not part:
+            continue
+        fields = part.split(":")
+        if len(fields) != 5 or not fields[0].isidentifier():
+            raise ValueError(f"ROI '{part}' is not name:y0:y1:x0:x1")
+        try:
+            y0, y1, x0, x1 = (int(value) for value in fields[1:])
+        except ValueError:
+            raise ValueError(f"ROI '{part}' has a bound that is not an integer")
+        if not (0 <= y0 < y1 and 0 <= x0 < x1):
+            raise ValueError(f"ROI '{part}' is empty")
+        rois[fields[0]] = (y0, y1, x0, x1)
+    return rois
+
+
+class StatsConfig:
+    """What to compute per frame.
+
+    With mask_to_zero the detector already sets invalid pixels to 0,
+    without it they carry the largest value of the pixel type and are
+    counted as masked and left out of every other number. Pixels at or
+    above saturation (default: one below that largest value) count as
+    saturated, pixels above hot_threshold as hot.
+    """
+
+    def __init__(self, rois=None, mask_to_zero=True, saturation=None, hot_threshold=None):
+        self.rois = dict(rois or {})
+        self.mask_to_zero = mask_to_zero
+        self.saturation = saturation
+        self.hot_threshold = hot_threshold
+
+    @property
+    def dtype(self):
+        return np.dtype(BASE_FIELDS + [(f"roi_{name}", "<i8") for name in self.rois])
+
+
+def compute_stats(frames, config, invalid, flags, work):
+    """Statistics of a batch of frames of shape (n, y, x), every value an array of n.
+
+    invalid (bool), flags (bool) and work (frame dtype) are preallocated
+    arrays with room for at least n frames, so a batch allocates nothing of
+    frame size. A ROI reaching over the frame edge is clipped.
+    """
+    count = len(frames)
+    invalid, flags, work = invalid[:count], flags[:count], work[:count]
+    axes = (1, 2)
+    limit = np.iinfo(frames.dtype).max if frames.dtype.kind in "ui" else None
+
+    np.copyto(work, frames)
+    if config.mask_to_zero or limit is None:
+        masked = np.zeros(count, dtype=np.int64)
+    else:
+        np.equal(frames, limit, out=invalid)
+        masked = invalid.sum(axis=axes)
+        work[invalid] = 0
+
+    stats = {"total": work.sum(axis=axes, dtype=np.int64), "max": work.max(axis=axes), "masked": masked}
+
+    saturation = config.saturation if config.saturation is not None else limit - 1 if limit is not None else None
+    if saturation is not None:
+        np.greater_equal(work, saturation, out=flags)
+        stats["saturated"] = flags.sum(axis=axes)
+    else:
+        stats["saturated"] = np.zeros(count, dtype=np.int64)
+
+    if config.hot_threshold is not None:
+        np.greater(work, config.hot_threshold, out=flags)
+        stats["hot"] = flags.sum(axis=axes)
+    else:
+        stats["hot"] = np.zeros(count, dtype=np.int64)
+
+    for name, (y0, y1, x0, x1) in config.rois.items():
+        stats[f"roi_{name}"] = work[:, y0:y1, x0:x1].sum(axis=axes, dtype=np.int64)
+
+    return stats
+
+
+# State of a statistics worker process, set up once by _attach_ring
+_worker = None
+
+
+def _attach_ring(name, capacity, shape, dtype, config):
+    global _worker
+    memory = shared_memory.SharedMemory(name=name)
+    frames = np.ndarray((capacity,) + shape, dtype, memory.buf)
+    _worker = {
+        "memory": memory,
+        "frames": frames,
+        "config": config,
+        "invalid": np.empty(frames.shape, dtype=bool),
+        "flags": np.empty(frames.shape, dtype=bool),
+        "work": np.empty_like(frames),
+    }
+
+
+def _process_slots(start, count):
+    frames = _worker["frames"][start:start + count]
+    return compute_stats(frames, _worker["config"], _worker["invalid"], _worker["flags"], _worker["work"])
+
+
+class StatsLog:
+    """Append-only log of statistics rows, CSV or, for a .npy path, a NumPy array file.
+
+    The .npy header is written with room for any row count and rewritten
+    after every append, so the file can be loaded with np.load at any time.
+    """
+
+    def __init__(self, path, dtype):
+        self.path = path
+        self.dtype = dtype
+        self.rows = 0
+        self.npy = path.endswith(".npy")
+
+        if self.npy:
+            self.file = open(path, "wb")
+            # Header length for the largest count, the header of a smaller one is padded to the same length
+            self.header_bytes = None
+            self.header_bytes = len(self.header(10 ** 15))
+            self.file.write(self.header(0))
+        else:
+            self.file = open(path, "w")
+            self.file.write(",".join(dtype.names) + "\n")
+            self.file.flush()
+
+    def header(self, rows):
+        text = repr({"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False, "shape": (rows,)})
+        preamble = b"\x93NUMPY\x01\x00"
+        length = self.header_bytes
+        if length is None:
+            # 10 bytes of preamble and length, padded to a multiple of 64 including the newline
+            length = -(-(10 + len(text) + 1) // 64) * 64
+        text = text.ljust(length - 10 - 1) + "\n"
+        return preamble + len(text).to_bytes(2, "little") + text.encode("latin1")
+
+    def write(self, rows):
+        if self.npy:
+            self.file.seek(0, 2)
+            self.file.write(rows.tobytes())
+            self.rows += len(rows)
+            self.file.seek(0)
+            self.file.write(self.header(self.rows))
+        else:
+            for row in rows.tolist():
+                self.file.write(",".join(repr(value) if isinstance(value, float) else str(value) for value in row)
+                                + "\n")
+            self.rows += len(rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class FrameStatsPipeline:
+    """Computes per-frame statistics in a worker process while frames arrive.
+
+    submit() copies a frame into a ring of capacity frames in shared memory
+    and returns at once; when the ring is full the frame is skipped and
+    counted in dropped, so a slow statistics stage never holds up the
+    acquisition. A dispatcher thread hands every contiguous run of waiting
+    frames to the worker as one batch, which computes all numbers with a
+    few NumPy reductions over the whole batch, while the next frames are
+    already copied in.
+
+    The last history rows are kept for plotting, recent() returns them in
+    order. With a log_path every row is also appended to a CSV or .npy log.
+    on_stats(rows) and on_error(error) are called from the dispatcher thread.
+    """
+
+    def __init__(self, config, capacity=64, history=2000, log_path=None, on_stats=None, on_error=None):
+        self.config = config
+        self.dtype = config.dtype
+        self.capacity = capacity
+        self.log_path = log_path
+        self.on_stats = on_stats
+        self.on_error = on_error
+
+        self.history = np.zeros(history, dtype=self.dtype)
+        self.history_rows = 0
+
+        self.condition = threading.Condition()
+        self.memory = None
+        self.frames = None
+        self.executor = None
+        self.numbers = np.zeros(capacity, dtype=np.int64)
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.head = 0         # frames submitted
+        self.tail = 0         # frames processed
+        self.dropped = 0
+        self.rejected = 0     # frames of another shape than the first one
+
+        self.log = None
+        self.stopped = False
+        self.thread = None
+
+    def start(self):
+        self.log = StatsLog(self.log_path, self.dtype) if self.log_path else None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def allocate(self, frame):
+        # Ring and worker are set up for the shape of the first frame
+        nbytes = self.capacity * frame.nbytes
+        self.memory = shared_memory.SharedMemory(create=True, size=nbytes)
+        self.frames = np.ndarray((self.capacity,) + frame.shape, frame.dtype, self.memory.buf)
+        # submit() runs on a receiving thread, the worker starts from a clean fork server instead of a fork of it
+        self.executor = ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("forkserver"),
+                                            initializer=_attach_ring,
+                                            initargs=(self.memory.name, self.capacity, frame.shape,
+                                                      frame.dtype, self.config))
+
+    def submit(self, frame, number=None):
+        # Callable from any thread, returns False if the frame was skipped
+        with self.condition:
+            if self.stopped:
+                return False
+            if self.frames is None:
+                self.allocate(frame)
+            elif frame.shape != self.frames.shape[1:] or frame.dtype != self.frames.dtype:
+                self.rejected += 1
+                return False
+            if self.head - self.tail >= self.capacity:
+                self.dropped += 1
+                return False
+
+            slot = self.head % self.capacity
+            self.frames[slot] = frame
+            self.numbers[slot] = self.head if number is None else number
+            self.times[slot] = time.time()
+            self.head += 1
+            self.condition.notify()
+        return True
+
+    def run(self):
+        try:
+            while True:
+                with self.condition:
+                    while self.head == self.tail and not self.stopped:
+                        self.condition.wait()
+                    if self.head == self.tail:
+                        return
+                    # Contiguous run of waiting slots, up to the end of the ring
+                    start = self.tail % self.capacity
+                    count = min(self.head - self.tail, self.capacity - start)
+
+                try:
+                    stats = self.executor.submit(_process_slots, start, count).result()
+                except Exception as e:
+                    stats = None
+                    if self.on_error is not None:
+                        self.on_error(e)
+
+                rows = None
+                if stats is not None:
+                    rows = np.zeros(count, dtype=self.dtype)
+                    rows["number"] = self.numbers[start:start + count]
+                    rows["time"] = self.times[start:start + count]
+                    for name, values in stats.items():
+                        rows[name] = values
+
+                with self.condition:
+                    self.tail += count
+
+                if rows is not None:
+                    self.deliver(rows)
+        finally:
+            self.close()
+
+    def deliver(self, rows):
+        kept = rows[-len(self.history):]
+        with self.condition:
+            slots = (self.history_rows + np.arange(len(kept))) % len(self.history)
+            self.history[slots] = kept
+            self.history_rows += len(kept)
+
+        if self.log is not None:
+            try:
+                self.log.write(rows)
+            except OSError as e:
+                if self.on_error is not None:
+                    self.on_error(e)
+
+        if self.on_stats is not None:
+            self.on_stats(rows)
+
+    def recent(self, count=None):
+        # The last count rows (all kept rows by default), oldest first
+        with self.condition:
+            size = len(self.history)
+            kept = min(self.history_rows, size)
+            count = kept if count is None else min(count, kept)
+            slots = (self.history_rows - count + np.arange(count)) % size
+            return self.history[slots]
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        if self.memory is not None:
+            self.frames = None
+            self.memory.close()
+            self.memory.unlink()
+        if self.log is not None:
+            self.log.close()
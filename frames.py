@@ -0,0 +1,114 @@
+import math
+import struct
+
+import numpy as np
+
+
+# TIFF tags needed to read the uncompressed images of the monitor interface
+TAG_WIDTH = 256
+TAG_HEIGHT = 257
+TAG_BITS_PER_SAMPLE = 258
+TAG_COMPRESSION = 259
+TAG_STRIP_OFFSETS = 273
+TAG_STRIP_BYTE_COUNTS = 279
+TAG_SAMPLE_FORMAT = 339
+
+# Size in bytes of the TIFF field types BYTE, ASCII, SHORT, LONG
+TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4}
+TIFF_TYPE_FORMATS = {1: "B", 2: "B", 3: "H", 4: "I"}
+
+
+def decode_tiff(data):
+    """Decode a single-image, uncompressed TIFF as sent by the monitor interface into a 2D array."""
+    if data[:4] == b"II*\x00":
+        order = "<"
+    elif data[:4] == b"MM\x00*":
+        order = ">"
+    else:
+        raise ValueError("Not a TIFF image")
+
+    (ifd_offset,) = struct.unpack_from(order + "I", data, 4)
+    (num_entries,) = struct.unpack_from(order + "H", data, ifd_offset)
+
+    tags = {}
+    for index in range(num_entries):
+        tag, field_type, count, value_offset = struct.unpack_from(order + "HHII", data, ifd_offset + 2 + index * 12)
+        if field_type not in TIFF_TYPE_SIZES:
+            continue
+
+        # Values of up to four bytes are stored in the entry itself
+        size = TIFF_TYPE_SIZES[field_type] * count
+        offset = ifd_offset + 2 + index * 12 + 8 if size <= 4 else value_offset
+        tags[tag] = struct.unpack_from(f"{order}{count}{TIFF_TYPE_FORMATS[field_type]}", data, offset)
+
+    if tags.get(TAG_COMPRESSION, (1,))[0] != 1:
+        raise ValueError("Compressed TIFF images are not supported")
+
+    width = tags[TAG_WIDTH][0]
+    height = tags[TAG_HEIGHT][0]
+    bits = tags.get(TAG_BITS_PER_SAMPLE, (8,))[0]
+    kind = {1: "u", 2: "i", 3: "f"}[tags.get(TAG_SAMPLE_FORMAT, (1,))[0]]
+    dtype = np.dtype(f"{order}{kind}{bits // 8}")
+
+    offsets = tags[TAG_STRIP_OFFSETS]
+    counts = tags[TAG_STRIP_BYTE_COUNTS]
+    if len(offsets) == 1:
+        # The common case, one strip, decoded without copying
+        pixels = np.frombuffer(data, dtype, width * height, offsets[0])
+    else:
+        pixels = np.frombuffer(b"".join(data[o:o + c] for o, c in zip(offsets, counts)), dtype, width * height)
+
+    return pixels.reshape(height, width)
+
+
+def mask_invalid(frame):
+    # Gaps and defective pixels are flagged with the maximum value of the pixel type
+    if frame.dtype.kind in "ui":
+        return np.where(frame == np.iinfo(frame.dtype).max, 0, frame)
+    return frame
+
+
+def block_factor(shape, width, height):
+    # Smallest integer factor which makes the frame fit into width x height
+    return max(1, math.ceil(shape[0] / height), math.ceil(shape[1] / width))
+
+
+def downsample(frame, factor, reduce=np.max):
+    """Reduce factor x factor pixel blocks to one pixel, cropping the incomplete edge blocks.
+
+    The maximum is the default, so single bright pixels stay visible.
+    """
+    if factor <= 1:
+        return frame
+    height = frame.shape[0] // factor * factor
+    width = frame.shape[1] // factor * factor
+    blocks = frame[:height, :width].reshape(height // factor, factor, width // factor, factor)
+    return reduce(blocks, axis=(1, 3))
+
+
+def scale_frame(frame, mode="log", low=1.0, high=99.5):
+    """Scale a frame to uint8 between the low and high percentile of its pixel values."""
+    values = frame.astype(np.float32)
+    if mode == "log":
+        np.log1p(values, out=values)
+
+    vmin, vmax = np.percentile(values, (low, high))
+    if vmax <= vmin:
+        vmax = vmin + 1.0
+
+    values -= vmin
+    values *= 255.0 / (vmax - vmin)
+    np.clip(values, 0, 255, out=values)
+    return values.astype(np.uint8)
+
+
+def to_pgm(image):
+    # Binary PGM, which Tk's PhotoImage reads without any extra library
+    header = f"P5 {image.shape[1]} {image.shape[0]} 255\n".encode()
+    return header + np.ascontiguousarray(image).tobytes()
+
+
+def render_frame(frame, width, height, mode="log", low=1.0, high=99.5):
+    """Block-downsample and scale a masked detector frame for display in a width x height canvas."""
+    frame = downsample(frame, block_factor(frame.shape, width, height))
+    return scale_frame(frame, mode, low, high)
@@ -0,0 +1,216 @@
+import threading
+import time
+
+import numpy as np
+
+from frames import decode_tiff
+from simplon import SimplonError, SimplonTimeout
+
+
+class FrameRing:
+    """Bounded ring of the latest frames in memory.
+
+    The ring array is allocated with the first frame, all frames must have
+    its shape and dtype. When the ring is full the oldest frame is
+    overwritten; with a spill_path it is first copied to a memory-mapped
+    .npy file of spill_capacity frames on local disk, itself a ring, so
+    np.load(spill_path, mmap_mode="r") reads it back. frame_numbers and
+    spill_numbers hold the running number of the frame in every slot, -1
+    for an empty one.
+    """
+
+    def __init__(self, capacity, spill_path=None, spill_capacity=1000):
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.spill_capacity = spill_capacity
+
+        self.lock = threading.Lock()
+        self.frames = None
+        self.frame_numbers = np.full(capacity, -1, dtype=np.int64)
+        self.spill = None
+        self.spill_numbers = np.full(spill_capacity, -1, dtype=np.int64) if spill_path else None
+
+        self.pushed = 0       # frames pushed in total
+        self.spilled = 0      # frames copied to the spill file
+        self.overwritten = 0  # frames lost because the ring (and the spill file) was full
+
+    def __len__(self):
+        return min(self.pushed, self.capacity)
+
+    def allocate(self, frame):
+        self.frames = np.empty((self.capacity,) + frame.shape, dtype=frame.dtype)
+        if self.spill_path:
+            self.spill = np.lib.format.open_memmap(self.spill_path, mode="w+", dtype=frame.dtype,
+                                                   shape=(self.spill_capacity,) + frame.shape)
+
+    def push(self, frame):
+        with self.lock:
+            if self.frames is None:
+                self.allocate(frame)
+            elif frame.shape != self.frames.shape[1:]:
+                raise ValueError(f"Frame of shape {frame.shape} in a ring of {self.frames.shape[1:]}")
+
+            slot = self.pushed % self.capacity
+            if self.pushed >= self.capacity:
+                self.evict(slot)
+
+            self.frames[slot] = frame
+            self.frame_numbers[slot] = self.pushed
+            self.pushed += 1
+
+    def evict(self, slot):
+        if self.spill is None:
+            self.overwritten += 1
+            return
+
+        spill_slot = self.spilled % self.spill_capacity
+        if self.spilled >= self.spill_capacity:
+            self.overwritten += 1
+        self.spill[spill_slot] = self.frames[slot]
+        self.spill_numbers[spill_slot] = self.frame_numbers[slot]
+        self.spilled += 1
+
+    def latest(self):
+        # Copy of the newest frame, or None
+        with self.lock:
+            if not self.pushed:
+                return None
+            return self.frames[(self.pushed - 1) % self.capacity].copy()
+
+    def close(self):
+        with self.lock:
+            if self.spill is not None:
+                self.spill.flush()
+                np.save(f"{self.spill_path}.numbers.npy", self.spill_numbers)
+                self.spill = None
+
+
+class MonitorConsumer:
+    """Drains images/next of the monitor interface continuously on a worker thread.
+
+    On start the monitor buffer_size and discard_new are set if given. Every
+    image is decoded into a FrameRing as soon as the DCU has it, so the DCU
+    buffer only has to absorb the images that arrive while one is being
+    fetched. A second thread polls the buffer_fill_level and dropped status
+    of the monitor every status_interval seconds.
+
+    on_frame(frame) is called from the drain thread with every frame, the
+    array is only valid during the call. on_error(error) is called from
+    either thread.
+    """
+
+    def __init__(self, client, capacity=64, buffer_size=None, discard_new=None, spill_path=None,
+                 spill_capacity=1000, wait_timeout=1.0, status_interval=0.5, on_frame=None, on_error=None):
+        self.client = client
+        self.buffer_size = buffer_size
+        self.discard_new = discard_new
+        self.wait_timeout = wait_timeout
+        self.status_interval = status_interval
+        self.on_frame = on_frame
+        self.on_error = on_error
+
+        self.ring = FrameRing(capacity, spill_path, spill_capacity)
+        self.errors = 0
+        self.fill_level = None   # [images in the DCU buffer, buffer size]
+        self.dropped = None      # images the DCU monitor dropped
+        self.rate_start = time.monotonic()
+        self.rate_count = 0
+
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def configure(self):
+        if self.buffer_size is not None:
+            self.client.set_monitor_config("buffer_size", self.buffer_size)
+        if self.discard_new is not None:
+            self.client.set_monitor_config("discard_new", self.discard_new)
+
+    def start(self):
+        # Raises SimplonError if the monitor cannot be configured, nothing is started then.
+        # A consumer runs once, stopped before it started it does nothing.
+        if self.stopped.is_set():
+            return
+        self.configure()
+        self.threads = [threading.Thread(target=self.drain, daemon=True),
+                        threading.Thread(target=self.poll_status, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def join(self, timeout=None):
+        for thread in self.threads:
+            thread.join(timeout)
+        self.ring.close()
+
+    def is_running(self):
+        return any(thread.is_alive() for thread in self.threads)
+
+    def report_error(self, error):
+        self.errors += 1
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def drain(self):
+        timeout = (self.client.timeout[0], self.wait_timeout)
+
+        while not self.stopped.is_set():
+            try:
+                data = self.client.monitor_image("next", timeout=timeout)
+            except SimplonTimeout:
+                # A read timeout only means that no image arrived
+                continue
+            except SimplonError as e:
+                # Anything else, a refused connection too, is reported and retried more slowly
+                self.report_error(e)
+                self.stopped.wait(1.0)
+                continue
+
+            if data is None:
+                self.stopped.wait(0.02)
+                continue
+
+            try:
+                frame = decode_tiff(data)
+                self.ring.push(frame)
+            except (ValueError, KeyError) as e:
+                self.report_error(e)
+                continue
+
+            self.rate_count += 1
+            if self.on_frame is not None:
+                self.on_frame(frame)
+
+    def take_rate(self):
+        # Frames per second since the previous call
+        now = time.monotonic()
+        count, self.rate_count = self.rate_count, 0
+        rate = count / max(now - self.rate_start, 1e-9)
+        self.rate_start = now
+        return rate
+
+    def poll_status(self):
+        while not self.stopped.is_set():
+            try:
+                self.fill_level = self.client.monitor_status("buffer_fill_level").get("value")
+                self.dropped = self.client.monitor_status("dropped").get("value")
+            except (SimplonError, ValueError) as e:
+                self.report_error(e)
+            self.stopped.wait(self.status_interval)
+
+    def status_text(self):
+        # Meant to be called at a fixed interval, the rate is measured between two calls
+        ring = self.ring
+        text = f"{ring.pushed} frames, {self.take_rate():.1f} Hz, ring {len(ring)}/{ring.capacity}"
+        if ring.spill_path:
+            text += f", spilled {ring.spilled}"
+        text += f", overwritten {ring.overwritten}"
+
+        if isinstance(self.fill_level, list) and len(self.fill_level) == 2:
+            text += f" | DCU buffer {self.fill_level[0]}/{self.fill_level[1]}"
+        if self.dropped is not None:
+            text += f", dropped {self.dropped}"
+        if self.errors:
+            text += f", {self.errors} errors"
+        return text
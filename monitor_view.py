@@ -0,0 +1,204 @@
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk
+
+from frames import decode_tiff, mask_invalid, render_frame, to_pgm
+from simplon import SimplonError, SimplonTimeout
+
+
+class MonitorPoller:
+    """Pulls images from the monitor interface on a worker thread.
+
+    Every image is decoded and rendered for the display size right away, but
+    only the latest result is kept: if the display has not picked up the
+    previous one yet, that one is dropped instead of queued.
+
+    images/monitor answers with the latest image again and again, so in
+    that mode at most one request is sent every interval seconds and an
+    image equal to the previous one is skipped, not rendered or counted.
+    """
+
+    def __init__(self, client, width, height, image="next", mode="log", timeout=1.0, interval=0.05, on_error=None):
+        self.client = client
+        self.width = width
+        self.height = height
+        self.image = image
+        self.mode = mode
+        self.timeout = timeout
+        self.interval = interval
+        self.on_error = on_error
+
+        self.lock = threading.Lock()
+        self.latest = None
+        self.received = 0
+        self.dropped = 0
+
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def take(self):
+        # Latest rendered frame, or None if there was no new one since the last call
+        with self.lock:
+            latest, self.latest = self.latest, None
+        return latest
+
+    def run(self):
+        previous = None
+        next_request = time.monotonic()
+
+        while not self.stopped.is_set():
+            image = self.image
+            if image == "monitor":
+                # Paced to the display rate, the drain needs the DCU more than the live view
+                if self.stopped.wait(max(0.0, next_request - time.monotonic())):
+                    break
+                next_request = time.monotonic() + self.interval
+
+            try:
+                data = self.client.monitor_image(image, timeout=(self.client.timeout[0], self.timeout))
+            except SimplonTimeout:
+                # A read timeout just means that no image arrived
+                continue
+            except SimplonError as e:
+                # Anything else, a refused connection too, is reported and retried more slowly
+                if self.on_error is not None:
+                    self.on_error(e)
+                self.stopped.wait(1.0)
+                continue
+
+            if data is None:
+                self.stopped.wait(0.05)
+                continue
+
+            # The same image as before, images/next never repeats one
+            if image == "monitor" and data == previous:
+                continue
+            previous = data
+
+            try:
+                frame = mask_invalid(decode_tiff(data))
+            except (ValueError, KeyError) as e:
+                if self.on_error is not None:
+                    self.on_error(e)
+                continue
+
+            image = render_frame(frame, self.width, self.height, self.mode)
+
+            with self.lock:
+                if self.latest is not None:
+                    self.dropped += 1
+                self.latest = (image, frame.shape, int(frame.max()))
+                self.received += 1
+
+
+class LiveView:
+    """Tk panel showing the monitor images at a capped refresh rate.
+
+    image is "next" to take the images out of the monitor buffer, or
+    "monitor" to only look at the latest one while something else drains
+    the buffer. on_status(text) is called from the poller thread on errors.
+    """
+
+    def __init__(self, parent, client, width=520, height=260, max_fps=20, image="next", on_status=None):
+        self.parent = parent
+        self.client = client
+        self.image = image
+        self.width = width
+        self.height = height
+        self.max_fps = max_fps
+        self.on_status = on_status
+
+        self.poller = None
+        self.after_id = None
+        self.photo = None
+        self.shown = 0
+        self.rate_start = time.monotonic()
+        self.rate_shown = 0
+
+        self.create_widgets()
+
+    def create_widgets(self):
+        self.frame = ttk.Frame(self.parent)
+        self.frame.pack(fill="both", expand="yes", padx=10, pady=10)
+
+        self.canvas = tk.Canvas(self.frame, width=self.width, height=self.height, background="black")
+        self.canvas.grid(row=0, column=0, columnspan=5, padx=5, pady=5)
+        self.image_item = self.canvas.create_image(0, 0, anchor=tk.NW)
+
+        self.start_button = ttk.Button(self.frame, text="Start", command=self.start)
+        self.start_button.grid(row=1, column=0, padx=5, pady=5)
+
+        self.stop_button = ttk.Button(self.frame, text="Stop", command=self.stop)
+        self.stop_button.grid(row=1, column=1, padx=5, pady=5)
+
+        self.mode_var = tk.StringVar(value="log")
+        self.mode_combo = ttk.Combobox(self.frame, textvariable=self.mode_var, values=("log", "linear"),
+                                       state="readonly", width=8)
+        self.mode_combo.grid(row=1, column=2, padx=5, pady=5)
+        self.mode_combo.bind("<<ComboboxSelected>>", self.set_mode)
+
+        self.info_label = ttk.Label(self.frame, text="Stopped.")
+        self.info_label.grid(row=1, column=3, columnspan=2, padx=5, pady=5, sticky=tk.W)
+
+    def set_mode(self, event=None):
+        if self.poller is not None:
+            self.poller.mode = self.mode_var.get()
+
+    def set_image(self, image):
+        self.image = image
+        if self.poller is not None:
+            self.poller.image = image
+
+    def report_error(self, error):
+        if self.on_status is not None:
+            self.on_status(f"Live view error: {error}")
+
+    def start(self):
+        if self.poller is not None:
+            return
+        self.poller = MonitorPoller(self.client, self.width, self.height, image=self.image,
+                                    mode=self.mode_var.get(), interval=1 / self.max_fps, on_error=self.report_error)
+        self.poller.start()
+        self.rate_start = time.monotonic()
+        self.rate_shown = 0
+        self.refresh()
+
+    def stop(self):
+        if self.after_id is not None:
+            self.parent.after_cancel(self.after_id)
+            self.after_id = None
+        if self.poller is not None:
+            self.poller.stop()
+            self.poller = None
+        self.info_label.config(text="Stopped.")
+
+    def refresh(self):
+        if self.poller is None:
+            return
+
+        latest = self.poller.take()
+        if latest is not None:
+            image, shape, max_value = latest
+            # Keep a reference, Tk drops images that are only referenced from the canvas
+            self.photo = tk.PhotoImage(data=to_pgm(image), format="PPM")
+            self.canvas.itemconfig(self.image_item, image=self.photo)
+            self.shown += 1
+            self.rate_shown += 1
+
+            elapsed = time.monotonic() - self.rate_start
+            if elapsed >= 1.0:
+                self.info_label.config(text=f"{self.rate_shown / elapsed:.1f} Hz, {shape[1]}x{shape[0]}, "
+                                            f"max {max_value}, dropped {self.poller.dropped}")
+                self.rate_start = time.monotonic()
+                self.rate_shown = 0
+
+        self.after_id = self.parent.after(int(1000 / self.max_fps), self.refresh)
@@ -0,0 +1,412 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from acquisition import TriggerScheduler, send_trigger
+from schema import ParamSchema
+from simplon import SimplonClient, SimplonError, apply_configs, fetch_configs
+
+# Headless counterpart of the GUI: runs a scan plan without importing tkinter.
+#
+# A plan is a JSON (or, with PyYAML installed, YAML) file with a list of steps,
+# either at the top level or under "steps" next to an optional "ip_address":
+#
+#   {"ip_address": "10.42.41.10",
+#    "steps": [
+#      {"config": {"count_time": 0.1, "frame_time": 0.1, "nimages": 1}},
+#      {"sweep": {"key": "photon_energy", "start": 8000, "stop": 12000, "step": 1000,
+#                 "steps": [{"filewriter_config": {"name_pattern": "energy_{value}"}},
+#                           {"arm": {"ntrigger": 10}},
+#                           {"trigger": {"count": 10, "period": 0.2}},
+#                           "disarm"]}},
+#      {"wait": 2.0}]}
+#
+# Steps:
+#   config / monitor_config / filewriter_config / stream_config: {key: value, ...}
+#   arm: null or {"ntrigger": n, "nimages": m}
+#   trigger: a count or {"count": n, "period": s, "count_time": s, "wait_for_idle": bool}
+#   wait: seconds or {"state": "idle", "timeout": s}
+#   disarm, abort
+#   sweep: {"key": k, "values": [...]} or start/stop/step, "subsystem" and the
+#          "steps" run after every value, with {value} and {index} replaced in strings
+
+# Config subsystems independent of the detector settings, so their steps between
+# two series can be sent alongside the detector config steps
+PIPELINED_SUBSYSTEMS = ("filewriter", "stream")
+
+CONFIG_STEPS = {
+    "config": "detector",
+    "detector_config": "detector",
+    "monitor_config": "monitor",
+    "filewriter_config": "filewriter",
+    "stream_config": "stream",
+}
+
+
+def load_plan(path):
+    with open(path) as f:
+        text = f.read()
+
+    if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError(f"{path}: YAML plans need PyYAML, install it or use JSON")
+        plan = yaml.safe_load(text)
+    else:
+        plan = json.loads(text)
+
+    if isinstance(plan, list):
+        plan = {"steps": plan}
+    if not isinstance(plan, dict) or not isinstance(plan.get("steps"), list):
+        raise ValueError(f"{path}: a scan plan is a list of steps or an object with 'steps'")
+    return plan
+
+
+def sweep_values(sweep):
+    if "values" in sweep:
+        return list(sweep["values"])
+
+    start, stop, step = sweep["start"], sweep["stop"], sweep["step"]
+    if step == 0 or (stop - start) / step < 0:
+        raise ValueError(f"Sweep of {sweep.get('key')} never reaches {stop}")
+    count = int(round((stop - start) / step)) + 1
+    # Computed from the index, repeated additions would accumulate rounding errors
+    return [start + index * step for index in range(count)]
+
+
+def substitute(value, variables):
+    if isinstance(value, str):
+        for name, replacement in variables.items():
+            value = value.replace("{" + name + "}", str(replacement))
+        return value
+    if isinstance(value, list):
+        return [substitute(item, variables) for item in value]
+    if isinstance(value, dict):
+        return {key: substitute(item, variables) for key, item in value.items()}
+    return value
+
+
+def expand_steps(steps, variables=None):
+    """Flatten a plan into a list of (op, args), unrolling the sweeps."""
+    expanded = []
+
+    for step in steps:
+        if isinstance(step, str):
+            op, args = step, None
+        elif isinstance(step, dict) and len(step) == 1:
+            (op, args), = step.items()
+        else:
+            raise ValueError(f"A step is a name or an object with a single key, not {step!r}")
+
+        if variables:
+            args = substitute(args, variables)
+
+        if op in CONFIG_STEPS:
+            if not isinstance(args, dict):
+                raise ValueError(f"{op} needs an object of key: value pairs")
+            expanded.append(("config", {"subsystem": CONFIG_STEPS[op], "values": args}))
+        elif op == "sweep":
+            subsystem = args.get("subsystem", "detector")
+            for index, value in enumerate(sweep_values(args)):
+                expanded.append(("config", {"subsystem": subsystem, "values": {args["key"]: value}}))
+                expanded += expand_steps(args.get("steps", []), dict(variables or {}, value=value, index=index))
+        elif op == "trigger":
+            args = args if isinstance(args, dict) else {"count": 1 if args is None else args}
+            expanded.append(("trigger", args))
+        elif op == "wait":
+            args = args if isinstance(args, dict) else {"seconds": args}
+            expanded.append(("wait", args))
+        elif op in ("arm", "disarm", "abort"):
+            expanded.append((op, args or {}))
+        else:
+            raise ValueError(f"Unknown step {op!r}")
+
+    return expanded
+
+
+def describe(op, args):
+    if op == "config":
+        values = ", ".join(f"{key}={value}" for key, value in args["values"].items())
+        return f"{args['subsystem']} config {values}"
+    if op == "trigger":
+        return f"trigger x{args.get('count', 1)}"
+    if op == "wait":
+        return f"wait {args['seconds']} s" if "seconds" in args else f"wait for {args.get('state', 'idle')}"
+    return op
+
+
+class ScanRunner:
+    """Executes an expanded scan plan with the Simplon operations of the GUI.
+
+    The current value of every config key the plan sets is fetched once,
+    concurrently, and then followed through the change lists of the PUTs,
+    so settings the detector already has are not sent again. As soon as a
+    series is over, the config steps up to the next arm are sent right
+    away for the subsystems in PIPELINED_SUBSYSTEMS, concurrently with the
+    detector config steps in between. Nothing is sent ahead while a series
+    is open, the filewriter names its files after the settings current at
+    the end of the series. Before the first step every config
+    value is checked against the metadata of its key, so a bad value stops
+    the plan before it starts instead of hours into it. An armed detector
+    is disarmed when the run ends early.
+
+    on_step(index, op, args, elapsed, error) is called after every step.
+    """
+
+    def __init__(self, client, steps, pipeline=True, keep_going=False, max_workers=8, on_step=None):
+        self.client = client
+        self.steps = steps
+        self.pipeline = pipeline
+        self.keep_going = keep_going
+        self.max_workers = max_workers
+        self.on_step = on_step
+
+        self.known = {}          # (subsystem, key) -> last known value
+        self.schemas = {}        # (subsystem, key) -> ParamSchema
+        self.armed = False
+        self.records = []
+        self.executor = ThreadPoolExecutor(max_workers=2)
+
+    def fetch_known(self):
+        keys = {}
+        for op, args in self.steps:
+            if op == "config":
+                keys.setdefault(args["subsystem"], set()).update(args["values"])
+        keys.setdefault("detector", set()).update(("trigger_mode", "ntrigger", "nimages"))
+
+        for subsystem, names in keys.items():
+            for key, data in fetch_configs(self.client, sorted(names), subsystem, self.max_workers).items():
+                if isinstance(data, dict) and "value" in data:
+                    self.known[(subsystem, key)] = data["value"]
+                    self.schemas[(subsystem, key)] = ParamSchema.from_data(data)
+
+    def validate(self):
+        # Every config value of the plan against the metadata of its key, before the first step runs
+        problems = []
+        for index, (op, args) in enumerate(self.steps):
+            if op != "config":
+                continue
+            for key, value in args["values"].items():
+                schema = self.schemas.get((args["subsystem"], key))
+                if schema is None:
+                    continue
+                try:
+                    if not schema.writable:
+                        raise ValueError("read only")
+                    schema.check(value)
+                except ValueError as e:
+                    problems.append(f"step {index + 1}, {args['subsystem']} {key}: {e}")
+        if problems:
+            raise ValueError("Invalid scan plan:\n  " + "\n  ".join(problems))
+
+    def configure(self, subsystem, values):
+        # Only the values that differ from what the detector already has are sent
+        changes = {key: value for key, value in values.items() if self.known.get((subsystem, key), object()) != value}
+        if not changes:
+            return []
+
+        result = apply_configs(self.client, changes, subsystem, max_workers=self.max_workers)
+        for key, data in result.refreshed.items():
+            if isinstance(data, dict) and "value" in data:
+                self.known[(subsystem, key)] = data["value"]
+            else:
+                self.known.pop((subsystem, key), None)
+        for key in result.errors:
+            self.known.pop((subsystem, key), None)
+
+        if result.errors:
+            raise SimplonError("; ".join(f"{key}: {error}" for key, error in result.errors.items()))
+        return result.applied
+
+    def arm(self, ntrigger=None, nimages=None):
+        if ntrigger is not None:
+            self.configure("detector", {"ntrigger": ntrigger, "nimages": 1 if nimages is None else nimages})
+        elif nimages is not None:
+            self.configure("detector", {"nimages": nimages})
+        self.client.detector_command("arm")
+        self.armed = True
+
+    def trigger(self, count=1, period=0.0, count_time=None, wait_for_idle=False):
+        trigger_mode = self.known.get(("detector", "trigger_mode"))
+        if not self.armed:
+            # Like the GUI: without an explicit arm, one arm covers the whole series
+            self.configure("detector", {"ntrigger": count, "nimages": self.known.get(("detector", "nimages"), 1)})
+            self.client.detector_command("arm")
+            self.armed = True
+
+        errors = []
+        scheduler = TriggerScheduler(self.client, count, period,
+                                     lambda index: send_trigger(self.client, trigger_mode, count_time),
+                                     wait_for_idle=wait_for_idle,
+                                     on_done=lambda stats, error: errors.append(error))
+        return scheduler, errors
+
+    def wait(self, seconds=None, state=None, timeout=None, poll_interval=0.05):
+        if seconds is not None:
+            time.sleep(seconds)
+            return
+
+        state = state or "idle"
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.client.detector_status("state").get("value") != state:
+            if deadline is not None and time.monotonic() > deadline:
+                raise SimplonError(f"Detector did not reach state {state} within {timeout} s")
+            time.sleep(poll_interval)
+
+    def disarm(self):
+        self.client.detector_command("disarm")
+        self.armed = False
+
+    def abort(self):
+        self.client.detector_command("abort")
+        self.armed = False
+
+    def run_step(self, index, op, args, pipelined):
+        if op == "config":
+            self.configure(args["subsystem"], args["values"])
+        elif op == "arm":
+            self.arm(args.get("ntrigger"), args.get("nimages"))
+        elif op == "trigger":
+            scheduler, errors = self.trigger(args.get("count", 1), args.get("period", 0.0),
+                                             args.get("count_time"), args.get("wait_for_idle", False))
+            scheduler.start()
+            scheduler.join()
+            # The DCU returns to idle by itself after the last trigger of the arm
+            self.armed = scheduler.stats.count < self.known.get(("detector", "ntrigger"), 1)
+            if errors and errors[0] is not None:
+                raise errors[0]
+            if not self.armed:
+                self.run_ahead(index, pipelined)
+        elif op == "wait":
+            self.wait(args.get("seconds"), args.get("state"), args.get("timeout"))
+        elif op == "disarm":
+            self.disarm()
+            self.run_ahead(index, pipelined)
+        elif op == "abort":
+            self.abort()
+            self.run_ahead(index, pipelined)
+
+    def run_ahead(self, index, pipelined):
+        # Only called while no series is open: send the pipelined config steps up to the next arm
+        if not self.pipeline or pipelined is None:
+            return
+
+        futures = []
+        for ahead in range(index + 1, len(self.steps)):
+            op, args = self.steps[ahead]
+            if op in ("arm", "trigger", "disarm", "abort"):
+                break
+            if op == "config" and args["subsystem"] in PIPELINED_SUBSYSTEMS and ahead not in pipelined:
+                futures.append((ahead, self.executor.submit(self.timed_step, ahead, op, args, None)))
+
+        for ahead, future in futures:
+            pipelined[ahead] = future
+
+    def timed_step(self, index, op, args, pipelined):
+        start = time.perf_counter()
+        error = None
+        try:
+            self.run_step(index, op, args, pipelined)
+        except (SimplonError, ValueError) as e:
+            error = e
+        return time.perf_counter() - start, error
+
+    def record(self, index, op, args, elapsed, error, pipelined=False):
+        self.records.append({"index": index, "step": describe(op, args), "elapsed": elapsed,
+                             "pipelined": pipelined, "error": None if error is None else str(error)})
+        if self.on_step is not None:
+            self.on_step(index, op, args, elapsed, error)
+
+    def run(self):
+        start = time.perf_counter()
+        pipelined = {}
+        failed = False
+
+        try:
+            self.fetch_known()
+            self.validate()
+            self.run_ahead(-1, pipelined)
+
+            for index, (op, args) in enumerate(self.steps):
+                if index in pipelined:
+                    elapsed, error = pipelined.pop(index).result()
+                    self.record(index, op, args, elapsed, error, pipelined=True)
+                else:
+                    elapsed, error = self.timed_step(index, op, args, pipelined)
+                    self.record(index, op, args, elapsed, error)
+
+                if error is not None:
+                    failed = True
+                    if not self.keep_going:
+                        break
+        finally:
+            for future in pipelined.values():
+                future.result()
+            if self.armed:
+                try:
+                    self.disarm()
+                except SimplonError:
+                    pass
+            self.executor.shutdown(wait=True)
+
+        return {"elapsed": time.perf_counter() - start, "failed": failed, "steps": self.records}
+
+
+def print_step(index, op, args, elapsed, error):
+    line = f"[{index + 1:4d}] {describe(op, args):<50s} {elapsed * 1000:8.1f} ms"
+    if error is not None:
+        line += f"  ERROR {error}"
+    print(line, flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a scan plan on an Eiger detector without the GUI")
+    parser.add_argument("plan", help="scan plan, JSON or YAML")
+    parser.add_argument("--ip", help="IP address of the DCU, overrides ip_address of the plan")
+    parser.add_argument("--dry-run", action="store_true", help="only print the expanded steps")
+    parser.add_argument("--no-pipeline", action="store_true", help="send every config step only when it is reached")
+    parser.add_argument("--keep-going", action="store_true", help="continue after a failed step")
+    parser.add_argument("--quiet", action="store_true", help="do not print every step")
+    parser.add_argument("--output", help="write the step timings to this JSON file")
+    parser.add_argument("--metrics", help="write the request latencies to this file, a Prometheus textfile "
+                                          "if it ends in .prom, JSON otherwise")
+    args = parser.parse_args()
+
+    try:
+        plan = load_plan(args.plan)
+        steps = expand_steps(plan["steps"])
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        sys.exit(f"Invalid scan plan: {e}")
+
+    if args.dry_run:
+        for index, (op, step_args) in enumerate(steps):
+            print(f"[{index + 1:4d}] {describe(op, step_args)}")
+        sys.exit(0)
+
+    ip_address = args.ip or plan.get("ip_address")
+    if not ip_address:
+        sys.exit("No DCU address, give --ip or ip_address in the plan")
+
+    client = SimplonClient(ip_address)
+    runner = ScanRunner(client, steps, pipeline=not args.no_pipeline, keep_going=args.keep_going,
+                        on_step=None if args.quiet else print_step)
+    try:
+        report = runner.run()
+    except KeyboardInterrupt:
+        sys.exit("Interrupted")
+    except ValueError as e:
+        sys.exit(str(e))
+    finally:
+        client.close()
+        if args.metrics:
+            client.stats.export(args.metrics)
+
+    print(f"{len(steps)} steps in {report['elapsed']:.2f} s" + (", with errors" if report["failed"] else ""))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if report["failed"] else 0)
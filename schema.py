@@ -0,0 +1,104 @@
+import ast
+import math
+
+
+class ParamSchema:
+    """Metadata of a Simplon config key: value type, limits, allowed values, unit and access mode.
+
+    The DCU sends it along with every config GET, so it is taken from the
+    first fetch of a key and kept for the session. parse() turns entry
+    text into the typed value and check() validates a typed value, both
+    raise ValueError with a message for the user, before anything is sent.
+    """
+
+    def __init__(self, value_type="string", access_mode="rw", min=None, max=None, allowed_values=None, unit=None):
+        self.value_type = value_type
+        self.access_mode = access_mode
+        self.min = min
+        self.max = max
+        self.allowed_values = allowed_values
+        self.unit = unit
+
+    @classmethod
+    def from_data(cls, data):
+        return cls(value_type=data.get("value_type", "string"), access_mode=data.get("access_mode", "rw"),
+                   min=data.get("min"), max=data.get("max"), allowed_values=data.get("allowed_values"),
+                   unit=data.get("unit"))
+
+    @property
+    def writable(self):
+        return "w" in self.access_mode
+
+    @property
+    def choices(self):
+        # Values for a dropdown, or None if the key takes free input
+        if self.allowed_values:
+            return [str(value) for value in self.allowed_values]
+        if self.value_type == "bool":
+            return ["True", "False"]
+        return None
+
+    def parse(self, text):
+        text = text.strip()
+
+        # Vector keys like detector_orientation are entered as a list
+        if text.startswith("["):
+            try:
+                values = ast.literal_eval(text)
+            except (ValueError, SyntaxError):
+                raise ValueError(f"'{text}' is not a list")
+            if not isinstance(values, list):
+                raise ValueError(f"'{text}' is not a list")
+            return [self.check(self.convert(str(value))) for value in values]
+
+        return self.check(self.convert(text))
+
+    def convert(self, text):
+        if self.value_type == "bool":
+            lowered = text.lower()
+            if lowered in ("true", "1"):
+                return True
+            if lowered in ("false", "0"):
+                return False
+            raise ValueError(f"'{text}' is not True or False")
+
+        if self.value_type == "float":
+            try:
+                return float(text)
+            except ValueError:
+                raise ValueError(f"'{text}' is not a number")
+
+        if self.value_type in ("int", "uint"):
+            try:
+                return int(text)
+            except ValueError:
+                raise ValueError(f"'{text}' is not an integer")
+
+        return text
+
+    def check(self, value):
+        if isinstance(value, list):
+            return [self.check(item) for item in value]
+
+        if self.value_type == "float":
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                raise ValueError(f"{value!r} is not a finite number")
+            value = float(value)
+        elif self.value_type in ("int", "uint"):
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise ValueError(f"{value!r} is not an integer")
+            if self.value_type == "uint" and value < 0:
+                raise ValueError(f"{value} is negative")
+        elif self.value_type == "bool" and not isinstance(value, bool):
+            raise ValueError(f"{value!r} is not True or False")
+
+        if self.allowed_values is not None and value not in self.allowed_values:
+            raise ValueError(f"{value!r} is not one of {', '.join(map(str, self.allowed_values))}")
+
+        unit = f" {self.unit}" if self.unit else ""
+        if self.min is not None and value < self.min:
+            raise ValueError(f"{value}{unit} is below the minimum of {self.min}{unit}")
+        if self.max is not None and value > self.max:
+            raise ValueError(f"{value}{unit} is above the maximum of {self.max}{unit}")
+
+        return value
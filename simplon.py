@@ -0,0 +1,273 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib.parse import quote, unquote, urlsplit
+
+from diagnostics import RequestStats
+
+
+# Simplon API version spoken by the DCU
+API_VERSION = "1.8.0"
+
+# List of changable configuration parameters for the DEiger detector
+config_params = ['beam_center_x', 'beam_center_y', 'count_time', 'counting_mode', 'detector_distance', 'detector_orientation', 'element', 'fast_arm', 'frame_time', 'incident_energy', 'nimages', 'ntrigger', 'photon_energy', 'roi_mode', 'sample_name', 'threshold/1/energy', 'threshold/1/mode', 'threshold/2/energy', 'threshold/2/mode', 'threshold/difference/mode', 'threshold_energy', 'trigger_mode', 'detector_translation', 'kappa_increment', 'kappa_start', 'mask_to_zero', 'omega_increment', 'omega_start', 'phi_increment', 'phi_start', 'total_flux', 'trigger_start_delay', 'two_theta_increment', 'two_theta_start', 'virtual_pixel_correction_applied']
+
+
+class SimplonError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SimplonTimeout(SimplonError):
+    # The DCU took the request but did not answer within the read timeout
+    pass
+
+
+class SimplonClient:
+    """Pooled, keep-alive HTTP client for the Simplon API of one DCU.
+
+    All requests share one requests.Session, so the TCP connection to the DCU
+    is reused instead of being opened again for every call. Every call has a
+    (connect, read) timeout, and idempotent GETs are retried a bounded number
+    of times. Non-2xx responses raise SimplonError, a read timeout raises
+    SimplonTimeout. Every request is
+    recorded in stats, a diagnostics.RequestStats that can be shared
+    between clients.
+    """
+
+    def __init__(self, ip_address, connect_timeout=2.0, read_timeout=10.0, retries=2, pool_size=16, stats=None):
+        self.ip_address = ip_address
+        self.timeout = (connect_timeout, read_timeout)
+        self.stats = stats if stats is not None else RequestStats()
+
+        # Only GETs and HEADs are retried, commands like arm or trigger must never be sent twice
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                      backoff_factor=0.1, status_forcelist=(502, 503, 504),
+                      allowed_methods=frozenset(["GET", "HEAD"]), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+
+        # images/next takes the image out of the buffer, a retried GET would lose the one already sent
+        self.session.mount(self.url("monitor", "images", "next"), HTTPAdapter(pool_connections=1, max_retries=0))
+
+    def close(self):
+        self.session.close()
+
+    def url(self, subsystem, section, key=""):
+        url = f"http://{self.ip_address}/{subsystem}/api/{API_VERSION}/{section}"
+
+        # URL encode the key, keeping the "/" of nested keys like threshold/1/energy
+        return f"{url}/{quote(key)}" if key else url
+
+    @staticmethod
+    def endpoint(url):
+        # detector/api/1.8.0/config/count_time -> detector/config/count_time, all files -> data
+        subsystem, _, rest = urlsplit(url).path.strip("/").partition("/")
+        prefix = f"api/{API_VERSION}/"
+        if rest.startswith(prefix):
+            return f"{subsystem}/{unquote(rest[len(prefix):])}"
+        return subsystem
+
+    def request(self, method, url, timeout=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.stats.record(method, self.endpoint(url), None, 0, time.perf_counter() - start)
+            if isinstance(e, requests.ReadTimeout):
+                raise SimplonTimeout(f"{method} {url} timed out: {e}") from e
+            raise SimplonError(f"{method} {url} failed: {e}") from e
+
+        # A streamed body is not read yet, its size is what the DCU announced
+        if kwargs.get("stream"):
+            nbytes = int(response.headers.get("Content-Length") or 0)
+        else:
+            nbytes = len(response.content)
+        self.stats.record(method, self.endpoint(url), response.status_code, nbytes, time.perf_counter() - start)
+
+        if response.status_code // 100 != 2:
+            raise SimplonError(f"{method} {url} returned status code {response.status_code}",
+                               response.status_code)
+        return response
+
+    def get(self, subsystem, section, key, timeout=None):
+        return self.request("GET", self.url(subsystem, section, key), timeout=timeout).json()
+
+    def put(self, subsystem, section, key, value=None, timeout=None):
+        # Config PUTs carry a value, commands are sent with an empty body
+        kwargs = {} if value is None else {"json": {"value": value}}
+        response = self.request("PUT", self.url(subsystem, section, key), timeout=timeout, **kwargs)
+
+        # Config PUTs answer with the list of parameters changed as a side effect,
+        # arm answers with the sequence id
+        if response.content:
+            try:
+                return response.json()
+            except ValueError:
+                return None
+        return None
+
+    # Detector subsystem
+
+    def detector_config(self, key, timeout=None):
+        return self.get("detector", "config", key, timeout)
+
+    def set_detector_config(self, key, value, timeout=None):
+        return self.put("detector", "config", key, value, timeout) or []
+
+    def detector_status(self, key, timeout=None):
+        return self.get("detector", "status", key, timeout)
+
+    def detector_command(self, command, value=None, timeout=None):
+        return self.put("detector", "command", command, value, timeout)
+
+    # Monitor subsystem
+
+    def monitor_config(self, key, timeout=None):
+        return self.get("monitor", "config", key, timeout)
+
+    def set_monitor_config(self, key, value, timeout=None):
+        return self.put("monitor", "config", key, value, timeout) or []
+
+    def monitor_status(self, key, timeout=None):
+        return self.get("monitor", "status", key, timeout)
+
+    def monitor_command(self, command, timeout=None):
+        return self.put("monitor", "command", command, timeout=timeout)
+
+    def monitor_image(self, image="next", timeout=None):
+        # TIFF bytes of images/next (oldest buffered image) or images/monitor (latest one),
+        # None if the monitor has no image to send. images/next is never retried.
+        try:
+            return self.request("GET", self.url("monitor", "images", image), timeout=timeout).content
+        except SimplonError as e:
+            if e.status_code in (404, 408):
+                return None
+            raise
+
+    # Filewriter subsystem
+
+    def filewriter_config(self, key, timeout=None):
+        return self.get("filewriter", "config", key, timeout)
+
+    def set_filewriter_config(self, key, value, timeout=None):
+        return self.put("filewriter", "config", key, value, timeout) or []
+
+    def filewriter_status(self, key, timeout=None):
+        return self.get("filewriter", "status", key, timeout)
+
+    def filewriter_command(self, command, timeout=None):
+        return self.put("filewriter", "command", command, timeout=timeout)
+
+    def filewriter_files(self, timeout=None):
+        # Names of the files currently stored on the DCU
+        return self.request("GET", self.url("filewriter", "files"), timeout=timeout).json() or []
+
+    def data_url(self, name):
+        return f"http://{self.ip_address}/data/{quote(name)}"
+
+    def data_file_size(self, name, timeout=None):
+        response = self.request("HEAD", self.data_url(name), timeout=timeout)
+        return int(response.headers.get("Content-Length", -1))
+
+    def open_data_file(self, name, offset=0, timeout=None):
+        # Streaming response, starting at offset if the DCU honours the range
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        return self.request("GET", self.data_url(name), timeout=timeout, headers=headers, stream=True)
+
+    def delete_data_file(self, name, timeout=None):
+        self.request("DELETE", self.data_url(name), timeout=timeout)
+
+    # Stream subsystem
+
+    def stream_config(self, key, timeout=None):
+        return self.get("stream", "config", key, timeout)
+
+    def set_stream_config(self, key, value, timeout=None):
+        return self.put("stream", "config", key, value, timeout) or []
+
+    def stream_status(self, key, timeout=None):
+        return self.get("stream", "status", key, timeout)
+
+    def stream_command(self, command, timeout=None):
+        return self.put("stream", "command", command, timeout=timeout)
+
+
+def fetch_configs(client, keys, subsystem="detector", max_workers=8, on_result=None):
+    """Fetch many config keys concurrently with at most max_workers requests in flight.
+
+    Returns a dict mapping every key to either its JSON description or the
+    error raised while fetching it. If given, on_result(key, data, error) is
+    called from the calling thread as soon as each key arrives.
+    """
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(client.get, subsystem, "config", key): key for key in keys}
+
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                data, error = future.result(), None
+            except (SimplonError, ValueError) as e:
+                data, error = None, e
+
+            results[key] = data if error is None else error
+            if on_result is not None:
+                on_result(key, data, error)
+
+    return results
+
+
+# Config keys whose PUT changes other keys as a side effect, in the order they
+# have to be applied so that a later explicit value is not overwritten again.
+# Energies first (photon_energy resets the thresholds), frame_time before count_time.
+CONFIG_ORDER = ['element', 'photon_energy', 'incident_energy', 'threshold_energy',
+                'threshold/1/energy', 'threshold/2/energy', 'frame_time', 'count_time']
+
+
+def order_config_changes(changes):
+    # Stable sort: keys without known dependencies keep their order after the ordered ones
+    rank = {key: index for index, key in enumerate(CONFIG_ORDER)}
+    return sorted(changes.items(), key=lambda item: rank.get(item[0], len(CONFIG_ORDER)))
+
+
+class ConfigApplyResult:
+    def __init__(self):
+        self.applied = []   # keys whose PUT succeeded, in the order they were sent
+        self.errors = {}    # key -> exception of the failed PUT
+        self.refreshed = {} # key -> JSON description or exception of the re-fetch
+
+
+def apply_configs(client, changes, subsystem="detector", refresh_keys=None, max_workers=8):
+    """Apply several config changes with as few requests as possible.
+
+    The PUTs are sent one by one in dependency order. Every PUT answers with
+    the list of keys it changed, and only those keys are fetched again
+    afterwards, concurrently. refresh_keys limits the re-fetch to the keys the
+    caller actually displays. A failing PUT does not stop the remaining ones.
+    """
+    result = ConfigApplyResult()
+    affected = set()
+
+    for key, value in order_config_changes(changes):
+        try:
+            affected.update(client.put(subsystem, "config", key, value) or [])
+        except SimplonError as e:
+            result.errors[key] = e
+            continue
+        result.applied.append(key)
+
+    if refresh_keys is not None:
+        affected &= set(refresh_keys)
+
+    if affected:
+        result.refreshed = fetch_configs(client, sorted(affected), subsystem, max_workers)
+
+    return result
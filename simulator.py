@@ -0,0 +1,425 @@
+import argparse
+import json
+import os
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+import numpy as np
+
+from simplon import API_VERSION
+
+
+def config(value, value_type, access_mode="rw", **metadata):
+    return dict(value=value, value_type=value_type, access_mode=access_mode, **metadata)
+
+
+# Detector configuration of the simulated EIGER2 R 500K, with the metadata the DCU sends along
+def default_detector_config():
+    return {
+        'beam_center_x': config(514.0, "float", unit="pixel"),
+        'beam_center_y': config(257.0, "float", unit="pixel"),
+        'count_time': config(0.5, "float", min=0.0000001, max=3600.0, unit="s"),
+        'counting_mode': config("normal", "string", allowed_values=["normal", "retrigger"]),
+        'detector_distance': config(0.1, "float", min=0.0, unit="m"),
+        'detector_orientation': config([-1.0, 0.0, 0.0, -1.0], "float"),
+        'element': config("", "string"),
+        'fast_arm': config(False, "bool"),
+        'frame_time': config(0.5, "float", min=0.0000001, max=3600.0, unit="s"),
+        'incident_energy': config(8041.0, "float", min=2700.0, max=100000.0, unit="eV"),
+        'nimages': config(1, "uint", min=1, max=2000000000),
+        'ntrigger': config(1, "uint", min=1, max=2000000000),
+        'photon_energy': config(8041.0, "float", min=2700.0, max=100000.0, unit="eV"),
+        'roi_mode': config("disabled", "string", allowed_values=["disabled"]),
+        'sample_name': config("", "string"),
+        'threshold/1/energy': config(4020.5, "float", min=1350.0, max=50000.0, unit="eV"),
+        'threshold/1/mode': config("enabled", "string", allowed_values=["enabled", "disabled"]),
+        'threshold/2/energy': config(8041.0, "float", min=1350.0, max=50000.0, unit="eV"),
+        'threshold/2/mode': config("disabled", "string", allowed_values=["enabled", "disabled"]),
+        'threshold/difference/mode': config("disabled", "string", allowed_values=["enabled", "disabled"]),
+        'threshold_energy': config(4020.5, "float", min=1350.0, max=50000.0, unit="eV"),
+        'trigger_mode': config("ints", "string", allowed_values=["eies", "exte", "extg", "exts", "inte", "ints"]),
+        'detector_translation': config([0.0, 0.0, 0.0], "float", unit="m"),
+        'kappa_increment': config(0.0, "float", unit="degree"),
+        'kappa_start': config(0.0, "float", unit="degree"),
+        'mask_to_zero': config(False, "bool"),
+        'omega_increment': config(0.0, "float", unit="degree"),
+        'omega_start': config(0.0, "float", unit="degree"),
+        'phi_increment': config(0.0, "float", unit="degree"),
+        'phi_start': config(0.0, "float", unit="degree"),
+        'total_flux': config(0.0, "float", min=0.0, unit="ph/s"),
+        'trigger_start_delay': config(0.0, "float", min=0.0, unit="s"),
+        'two_theta_increment': config(0.0, "float", unit="degree"),
+        'two_theta_start': config(0.0, "float", unit="degree"),
+        'virtual_pixel_correction_applied': config(True, "bool"),
+        'detector_readout_time': config(0.0000001, "float", access_mode="r", unit="s"),
+        'x_pixels_in_detector': config(1028, "uint", access_mode="r"),
+        'y_pixels_in_detector': config(512, "uint", access_mode="r"),
+        'bit_depth_image': config(32, "uint", access_mode="r"),
+    }
+
+
+def encode_tiff(frame):
+    # Uncompressed single-strip little-endian TIFF, like the images of the monitor interface
+    frame = np.ascontiguousarray(frame, dtype="<u4")
+    height, width = frame.shape
+    entries = [(256, 4, 1, width), (257, 4, 1, height), (258, 3, 1, 32), (259, 3, 1, 1),
+               (262, 3, 1, 1), (273, 4, 1, 0), (277, 3, 1, 1), (278, 4, 1, height),
+               (279, 4, 1, frame.nbytes), (339, 3, 1, 1)]
+    data_offset = 8 + 2 + len(entries) * 12 + 4
+
+    ifd = struct.pack("<H", len(entries))
+    for tag, field_type, count, value in entries:
+        value = data_offset if tag == 273 else value
+        packed = struct.pack("<HH", value, 0) if field_type == 3 else struct.pack("<I", value)
+        ifd += struct.pack("<HHI", tag, field_type, count) + packed
+    ifd += struct.pack("<I", 0)
+
+    return b"II*\x00" + struct.pack("<I", 8) + ifd + frame.tobytes()
+
+
+class SimulatedDetector:
+    """State of the simulated DCU: configuration, state machine and stored data.
+
+    time_scale shortens every exposure, 0.01 lets a 0.5 s frame take 5 ms.
+    """
+
+    def __init__(self, arm_time=0.05, time_scale=0.01, file_size=1 << 20, shape=None):
+        self.lock = threading.RLock()
+        self.arm_time = arm_time
+        self.time_scale = time_scale
+        self.file_size = file_size
+
+        self.detector_config = default_detector_config()
+        self.shape = shape or (self.detector_config['y_pixels_in_detector']['value'],
+                               self.detector_config['x_pixels_in_detector']['value'])
+
+        self.config = {
+            "detector": self.detector_config,
+            "monitor": {
+                "mode": config("disabled", "string", allowed_values=["enabled", "disabled"]),
+                "buffer_size": config(16, "uint", min=1, max=1000),
+                "discard_new": config(False, "bool"),
+            },
+            "filewriter": {
+                "mode": config("enabled", "string", allowed_values=["enabled", "disabled"]),
+                "name_pattern": config("series_$id", "string"),
+                "nimages_per_file": config(1000, "uint", min=0),
+            },
+            "stream": {
+                "mode": config("disabled", "string", allowed_values=["enabled", "disabled"]),
+                "header_detail": config("basic", "string", allowed_values=["all", "basic", "none"]),
+            },
+        }
+
+        self.state = "idle"
+        self.sequence_id = 0
+        self.triggers_left = 0
+        self.images = []
+        self.dropped = 0
+        self.files = {}
+
+    def status(self, subsystem, key):
+        with self.lock:
+            values = {
+                ("detector", "state"): self.state,
+                ("detector", "temperature"): 25.0,
+                ("detector", "humidity"): 5.0,
+                ("detector", "time"): time.strftime("%Y-%m-%dT%H:%M:%S"),
+                ("monitor", "state"): "normal",
+                ("monitor", "buffer_fill_level"): [len(self.images), self.config["monitor"]["buffer_size"]["value"]],
+                ("monitor", "dropped"): self.dropped,
+                ("filewriter", "state"): "ready",
+                ("filewriter", "buffer_free"): 4 << 30,
+                ("stream", "state"): "ready",
+                ("stream", "dropped"): 0,
+            }
+        if (subsystem, key) not in values:
+            return None
+        return {"value": values[(subsystem, key)], "value_type": "string"}
+
+    def set_config(self, subsystem, key, value):
+        with self.lock:
+            params = self.config[subsystem]
+            if key not in params or params[key]["access_mode"] != "rw":
+                raise KeyError(key)
+            param = params[key]
+            if "allowed_values" in param and value not in param["allowed_values"]:
+                raise ValueError(value)
+            if "min" in param and value < param["min"] or "max" in param and value > param["max"]:
+                raise ValueError(value)
+
+            param["value"] = value
+            changed = [key]
+            if subsystem == "detector":
+                changed += self.side_effects(key, value)
+            return changed
+
+    def side_effects(self, key, value):
+        # The couplings of the real detector that the GUI has to follow
+        params = self.detector_config
+        readout = params['detector_readout_time']['value']
+        changed = []
+
+        if key in ('photon_energy', 'incident_energy'):
+            other = 'incident_energy' if key == 'photon_energy' else 'photon_energy'
+            params[other]['value'] = value
+            params['threshold_energy']['value'] = value / 2
+            params['threshold/1/energy']['value'] = value / 2
+            changed += [other, 'threshold_energy', 'threshold/1/energy']
+        elif key == 'threshold_energy':
+            params['threshold/1/energy']['value'] = value
+            changed.append('threshold/1/energy')
+        elif key == 'threshold/1/energy':
+            params['threshold_energy']['value'] = value
+            changed.append('threshold_energy')
+        elif key == 'count_time' and params['frame_time']['value'] < value + readout:
+            params['frame_time']['value'] = value + readout
+            changed.append('frame_time')
+        elif key == 'frame_time' and params['count_time']['value'] > value - readout:
+            params['count_time']['value'] = value - readout
+            changed.append('count_time')
+        return changed
+
+    def command(self, subsystem, command, value=None):
+        if subsystem == "monitor" and command == "clear":
+            with self.lock:
+                self.images.clear()
+            return None
+        if subsystem == "filewriter" and command == "clear":
+            with self.lock:
+                self.files.clear()
+            return None
+        if subsystem != "detector":
+            raise KeyError(command)
+
+        if command == "arm":
+            time.sleep(self.arm_time)
+            with self.lock:
+                if self.state != "idle":
+                    raise ValueError("not idle")
+                self.sequence_id += 1
+                self.triggers_left = self.detector_config['ntrigger']['value']
+                self.state = "ready"
+                return {"sequence id": self.sequence_id}
+
+        if command == "trigger":
+            return self.trigger(value)
+
+        if command in ("disarm", "abort", "cancel"):
+            with self.lock:
+                if command == "disarm" and self.state != "idle":
+                    self.write_files()
+                self.state = "idle"
+                self.triggers_left = 0
+            return {"sequence id": self.sequence_id}
+
+        if command == "initialize":
+            with self.lock:
+                self.state = "idle"
+            return None
+
+        raise KeyError(command)
+
+    def trigger(self, count_time=None):
+        with self.lock:
+            if self.state != "ready" or self.triggers_left <= 0:
+                raise ValueError("not armed")
+            self.state = "acquire"
+            nimages = self.detector_config['nimages']['value']
+            frame_time = count_time or self.detector_config['frame_time']['value']
+
+        # Like the DCU, the trigger command returns once its images are taken
+        time.sleep(nimages * frame_time * self.time_scale)
+
+        with self.lock:
+            if self.state != "acquire":
+                # Aborted in the meantime
+                return None
+            self.add_images(nimages)
+            self.triggers_left -= 1
+            if self.triggers_left > 0:
+                self.state = "ready"
+            else:
+                self.write_files()
+                self.state = "idle"
+        return None
+
+    def add_images(self, count):
+        if self.config["monitor"]["mode"]["value"] != "enabled":
+            return
+        buffer_size = self.config["monitor"]["buffer_size"]["value"]
+        for _ in range(count):
+            if len(self.images) >= buffer_size:
+                if self.config["monitor"]["discard_new"]["value"]:
+                    self.dropped += 1
+                    continue
+                self.images.pop(0)
+                self.dropped += 1
+            self.images.append(np.random.poisson(2, self.shape).astype(np.uint32))
+
+    def write_files(self):
+        if self.config["filewriter"]["mode"]["value"] != "enabled":
+            return
+        name = self.config["filewriter"]["name_pattern"]["value"].replace("$id", str(self.sequence_id))
+        self.files[f"{name}_master.h5"] = os.urandom(self.file_size // 4)
+        self.files[f"{name}_data_000001.h5"] = os.urandom(self.file_size)
+
+    def next_image(self, latest=False):
+        with self.lock:
+            if not self.images:
+                return None
+            frame = self.images[-1] if latest else self.images.pop(0)
+        return encode_tiff(frame)
+
+
+class SimplonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, Nagle would delay every response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def detector(self):
+        return self.server.detector
+
+    def send(self, code, body=b"", content_type="application/json", headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def route(self):
+        # Returns (subsystem, section, key) for API URLs, ("data", name) for files
+        time.sleep(self.server.latency)
+        path = unquote(urlsplit(self.path).path).strip("/")
+        parts = path.split("/")
+
+        if parts[0] == "data" and len(parts) > 1:
+            return "data", "/".join(parts[1:]), None
+        if len(parts) >= 4 and parts[1] == "api" and parts[2] == API_VERSION:
+            return parts[0], parts[3], "/".join(parts[4:])
+        return None, None, None
+
+    def read_value(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if not length:
+            return None
+        return json.loads(self.rfile.read(length)).get("value")
+
+    def do_GET(self):
+        subsystem, section, key = self.route()
+
+        if subsystem == "data":
+            return self.send_file(section)
+        if subsystem not in self.detector.config:
+            return self.send(404)
+
+        if section == "config" and key in self.detector.config[subsystem]:
+            return self.send(200, self.detector.config[subsystem][key])
+        if section == "status":
+            status = self.detector.status(subsystem, key)
+            return self.send(200, status) if status is not None else self.send(404)
+        if subsystem == "monitor" and section == "images" and key in ("next", "monitor"):
+            image = self.detector.next_image(latest=key == "monitor")
+            return self.send(200, image, "image/tiff") if image is not None else self.send(408)
+        if subsystem == "filewriter" and section == "files":
+            return self.send(200, list(self.detector.files))
+        return self.send(404)
+
+    do_HEAD = do_GET
+
+    def do_PUT(self):
+        subsystem, section, key = self.route()
+        if subsystem not in self.detector.config:
+            return self.send(404)
+
+        try:
+            value = self.read_value()
+            if section == "config":
+                return self.send(200, self.detector.set_config(subsystem, key, value))
+            if section == "command":
+                result = self.detector.command(subsystem, key, value)
+                return self.send(200, result) if result is not None else self.send(200)
+        except KeyError:
+            return self.send(404)
+        except ValueError:
+            return self.send(400)
+        return self.send(404)
+
+    def do_DELETE(self):
+        subsystem, name, _ = self.route()
+        with self.detector.lock:
+            if subsystem != "data" or name not in self.detector.files:
+                return self.send(404)
+            del self.detector.files[name]
+        return self.send(204)
+
+    def send_file(self, name):
+        data = self.detector.files.get(name)
+        if data is None:
+            return self.send(404)
+
+        requested = self.headers.get("Range", "")
+        if requested.startswith("bytes="):
+            offset = int(requested[len("bytes="):].split("-")[0])
+            if offset >= len(data):
+                return self.send(416, headers={"Content-Range": f"bytes */{len(data)}"})
+            headers = {"Content-Range": f"bytes {offset}-{len(data) - 1}/{len(data)}"}
+            return self.send(206, data[offset:], "application/octet-stream", headers)
+        return self.send(200, data, "application/octet-stream")
+
+
+class SimplonSimulator:
+    """Local HTTP stand-in for the Simplon 1.8.0 API of a DCU.
+
+    Serves the detector, monitor, filewriter and stream endpoints the GUI
+    uses, and the stored files under /data. latency is added to every
+    request, in seconds. Use port 0 to pick a free port.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, **detector_options):
+        self.detector = SimulatedDetector(**detector_options)
+        self.server = ThreadingHTTPServer((host, port), SimplonHandler)
+        self.server.daemon_threads = True
+        self.server.detector = self.detector
+        self.server.latency = latency
+        self.thread = None
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Simplon API of an EIGER DCU")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--arm-time", type=float, default=0.05, help="seconds an arm takes")
+    parser.add_argument("--time-scale", type=float, default=0.01, help="factor applied to every exposure")
+    args = parser.parse_args()
+
+    simulator = SimplonSimulator(args.host, args.port, args.latency, arm_time=args.arm_time, time_scale=args.time_scale)
+    print(f"Simplon simulator listening on {simulator.address}")
+    simulator.server.serve_forever()
@@ -0,0 +1,228 @@
+import time
+import tkinter as tk
+from tkinter import filedialog
+from tkinter import ttk
+
+import numpy as np
+
+from frame_stats import FrameStatsPipeline, StatsConfig, parse_rois
+
+
+COLORS = ("#1f77b4", "#d62728", "#2ca02c", "#ff7f0e", "#9467bd", "#8c564b", "#e377c2", "#17becf")
+
+
+class RollingPlot:
+    """Line plot of the latest values of a few series on a Tk canvas.
+
+    The line items are created once per series and only get new
+    coordinates on every update, with at most one point per pixel.
+    """
+
+    def __init__(self, parent, title, width=520, height=110):
+        self.width = width
+        self.height = height
+        self.margin = 60
+
+        self.canvas = tk.Canvas(parent, width=width, height=height, background="white")
+        self.canvas.create_text(self.margin, 4, text=title, anchor=tk.NW)
+        self.canvas.create_rectangle(self.margin, 20, width - 4, height - 4, outline="gray")
+        self.top_label = self.canvas.create_text(self.margin - 4, 20, anchor=tk.NE, text="")
+        self.bottom_label = self.canvas.create_text(self.margin - 4, height - 4, anchor=tk.SE, text="")
+        self.lines = {}
+        self.legend = {}
+
+    def grid(self, **kwargs):
+        self.canvas.grid(**kwargs)
+
+    def update(self, series):
+        # series: list of (name, values), every values array scaled to the common range
+        lengths = [len(values) for _, values in series]
+        if not series or not max(lengths):
+            for line in self.lines.values():
+                self.canvas.coords(line, 0, 0, 0, 0)
+            return
+
+        low = min(float(values.min()) for _, values in series if len(values))
+        high = max(float(values.max()) for _, values in series if len(values))
+        if high == low:
+            high = low + 1
+        self.canvas.itemconfig(self.top_label, text=f"{high:.4g}")
+        self.canvas.itemconfig(self.bottom_label, text=f"{low:.4g}")
+
+        left, top, right, bottom = self.margin + 1, 21, self.width - 5, self.height - 5
+        for name, values in series:
+            line = self.lines.get(name)
+            if line is None:
+                color = COLORS[len(self.lines) % len(COLORS)]
+                line = self.lines[name] = self.canvas.create_line(0, 0, 0, 0, fill=color)
+                self.legend[name] = self.canvas.create_text(right - 4 - 90 * len(self.legend), 4, anchor=tk.NE,
+                                                            text=name, fill=color)
+
+            if len(values) < 2:
+                self.canvas.coords(line, 0, 0, 0, 0)
+                continue
+            step = max(1, len(values) // (right - left))
+            values = values[::-step][::-1]
+            xs = np.linspace(left, right, len(values))
+            ys = bottom - (values - low) / (high - low) * (bottom - top)
+            self.canvas.coords(line, *np.column_stack((xs, ys)).ravel().tolist())
+
+
+class StatsView:
+    """Tk panel with rolling plots of the per-frame statistics.
+
+    Frames come in through submit() from whatever receives them, the
+    monitor drain or the stream receiver, and are only used while the
+    statistics are started. mask_to_zero is the detector setting the
+    frames were taken with, image_label names what every frame holds, e.g.
+    the difference of the thresholds. on_status(text) is called with
+    errors, possibly from a worker thread.
+    """
+
+    def __init__(self, parent, mask_to_zero=True, image_label="threshold 1", refresh_interval=250, on_status=None):
+        self.parent = parent
+        self.mask_to_zero = mask_to_zero
+        self.image_label = image_label
+        self.refresh_interval = refresh_interval
+        self.on_status = on_status
+
+        self.pipeline = None
+        self.after_id = None
+        self.rate_start = time.monotonic()
+        self.rate_rows = 0
+
+        self.create_widgets()
+
+    def create_widgets(self):
+        self.frame = ttk.Frame(self.parent)
+        self.frame.pack(fill="both", expand="yes", padx=10, pady=10)
+
+        self.total_plot = RollingPlot(self.frame, "Total counts")
+        self.total_plot.grid(row=0, column=0, columnspan=6, padx=5, pady=5)
+
+        self.max_plot = RollingPlot(self.frame, "Max pixel")
+        self.max_plot.grid(row=1, column=0, columnspan=6, padx=5, pady=5)
+
+        self.pixel_plot = RollingPlot(self.frame, "Saturated and hot pixels")
+        self.pixel_plot.grid(row=2, column=0, columnspan=6, padx=5, pady=5)
+
+        self.roi_plot = RollingPlot(self.frame, "ROI sums")
+        self.roi_plot.grid(row=3, column=0, columnspan=6, padx=5, pady=5)
+
+        self.roi_label = ttk.Label(self.frame, text="ROIs (name:y0:y1:x0:x1; ...):")
+        self.roi_label.grid(row=4, column=0, padx=5, pady=5, sticky=tk.W)
+
+        self.roi_entry = ttk.Entry(self.frame, width=40)
+        self.roi_entry.grid(row=4, column=1, columnspan=3, padx=5, pady=5, sticky=tk.W)
+
+        self.hot_label = ttk.Label(self.frame, text="Hot Pixel Threshold:")
+        self.hot_label.grid(row=5, column=0, padx=5, pady=5, sticky=tk.W)
+
+        self.hot_entry = ttk.Entry(self.frame, width=12)
+        self.hot_entry.grid(row=5, column=1, padx=5, pady=5, sticky=tk.W)
+
+        self.saturation_label = ttk.Label(self.frame, text="Saturation:")
+        self.saturation_label.grid(row=5, column=2, padx=5, pady=5, sticky=tk.W)
+
+        # Empty means the counter limit, one below the invalid pixel value
+        self.saturation_entry = ttk.Entry(self.frame, width=12)
+        self.saturation_entry.grid(row=5, column=3, padx=5, pady=5, sticky=tk.W)
+
+        self.log_label = ttk.Label(self.frame, text="Log File (.csv/.npy):")
+        self.log_label.grid(row=6, column=0, padx=5, pady=5, sticky=tk.W)
+
+        self.log_entry = ttk.Entry(self.frame, width=40)
+        self.log_entry.grid(row=6, column=1, columnspan=3, padx=5, pady=5, sticky=tk.W)
+
+        self.browse_button = ttk.Button(self.frame, text="Browse", command=self.browse_log_path)
+        self.browse_button.grid(row=6, column=4, padx=5, pady=5)
+
+        self.start_button = ttk.Button(self.frame, text="Start", command=self.start)
+        self.start_button.grid(row=7, column=0, padx=5, pady=5, sticky=tk.W)
+
+        self.stop_button = ttk.Button(self.frame, text="Stop", command=self.stop)
+        self.stop_button.grid(row=7, column=1, padx=5, pady=5, sticky=tk.W)
+
+        self.info_label = ttk.Label(self.frame, text="Stopped.")
+        self.info_label.grid(row=7, column=2, columnspan=4, padx=5, pady=5, sticky=tk.W)
+
+    def browse_log_path(self):
+        path = filedialog.asksaveasfilename(parent=self.parent, defaultextension=".csv",
+                                            filetypes=[("CSV", "*.csv"), ("NumPy array", "*.npy")])
+        if path:
+            self.log_entry.delete(0, tk.END)
+            self.log_entry.insert(0, path)
+
+    def report_error(self, error):
+        if self.on_status is not None:
+            self.on_status(f"Frame statistics error: {error}")
+
+    def read_config(self):
+        rois = parse_rois(self.roi_entry.get())
+        hot = self.hot_entry.get().strip()
+        saturation = self.saturation_entry.get().strip()
+        return StatsConfig(rois, mask_to_zero=self.mask_to_zero, saturation=int(saturation) if saturation else None,
+                           hot_threshold=int(hot) if hot else None)
+
+    def start(self):
+        if self.pipeline is not None:
+            return
+        try:
+            config = self.read_config()
+        except ValueError as e:
+            self.info_label.config(text=f"Invalid settings: {e}")
+            return
+
+        pipeline = FrameStatsPipeline(config, log_path=self.log_entry.get().strip() or None,
+                                      on_error=self.report_error)
+        try:
+            pipeline.start()
+        except OSError as e:
+            self.info_label.config(text=f"Cannot open the log file: {e}")
+            return
+        self.pipeline = pipeline
+        self.rate_start = time.monotonic()
+        self.rate_rows = 0
+        self.info_label.config(text="Waiting for frames.")
+        self.refresh()
+
+    def stop(self):
+        if self.after_id is not None:
+            self.parent.after_cancel(self.after_id)
+            self.after_id = None
+        if self.pipeline is not None:
+            # The dispatcher finishes the frames already copied in, then closes the worker and the log
+            self.pipeline.stop()
+            self.pipeline = None
+        self.info_label.config(text="Stopped.")
+
+    def submit(self, frame, number=None):
+        # Called from the receiving threads, the frame is copied before this returns
+        pipeline = self.pipeline
+        if pipeline is not None:
+            pipeline.submit(frame, number)
+
+    def refresh(self):
+        pipeline = self.pipeline
+        if pipeline is None:
+            return
+
+        rows = pipeline.recent()
+        self.total_plot.update([(self.image_label, rows["total"])])
+        self.max_plot.update([("max", rows["max"])])
+        self.pixel_plot.update([(name, rows[name]) for name in ("saturated", "hot")])
+        self.roi_plot.update([(name, rows[f"roi_{name}"]) for name in pipeline.config.rois])
+
+        elapsed = time.monotonic() - self.rate_start
+        if elapsed >= 1.0:
+            rate = (pipeline.history_rows - self.rate_rows) / elapsed
+            text = f"{pipeline.history_rows} frames, {rate:.1f} Hz, dropped {pipeline.dropped}"
+            if pipeline.rejected:
+                text += f", {pipeline.rejected} of another shape"
+            if len(rows):
+                text += f", last total {rows['total'][-1]}"
+            self.info_label.config(text=text)
+            self.rate_start = time.monotonic()
+            self.rate_rows = pipeline.history_rows
+
+        self.after_id = self.parent.after(self.refresh_interval, self.refresh)
@@ -0,0 +1,90 @@
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from simplon import SimplonError
+
+
+# Status keys polled by default, as (subsystem, key)
+DEFAULT_STATUS_KEYS = [
+    ("detector", "state"),
+    ("detector", "temperature"),
+    ("detector", "humidity"),
+    ("monitor", "state"),
+    ("monitor", "buffer_fill_level"),
+    ("monitor", "dropped"),
+    ("filewriter", "state"),
+    ("filewriter", "buffer_free"),
+    ("stream", "state"),
+    ("stream", "dropped"),
+]
+
+# Detector states in which the status is polled at the fast interval
+ACTIVE_STATES = ("initialize", "configure", "ready", "acquire")
+
+
+class StatusMonitor:
+    """Polls a set of status keys concurrently on a background thread.
+
+    The interval adapts to the detector: fast_interval while it is armed or
+    acquiring, slow_interval otherwise. Every key keeps the last history
+    values with their time.time() in a ring buffer. on_change(key, value)
+    is called from the monitor thread only for keys whose value changed, a
+    failed request is reported as the value None.
+    """
+
+    def __init__(self, client, keys=None, fast_interval=0.2, slow_interval=2.0, history=256, workers=4,
+                 on_change=None):
+        self.client = client
+        self.keys = list(keys or DEFAULT_STATUS_KEYS)
+        self.fast_interval = fast_interval
+        self.slow_interval = slow_interval
+        self.workers = workers
+        self.on_change = on_change
+
+        self.values = {}
+        self.history = {key: collections.deque(maxlen=history) for key in self.keys}
+
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def poll_key(self, key):
+        subsystem, name = key
+        try:
+            return self.client.get(subsystem, "status", name).get("value")
+        except (SimplonError, ValueError):
+            return None
+
+    @property
+    def active(self):
+        state = self.values.get(("detector", "state"))
+        return isinstance(state, str) and state.lower() in ACTIVE_STATES
+
+    def interval(self):
+        return self.fast_interval if self.active else self.slow_interval
+
+    def poll(self, executor):
+        now = time.time()
+        for key, value in zip(self.keys, executor.map(self.poll_key, self.keys)):
+            self.history[key].append((now, value))
+            if key in self.values and self.values[key] == value:
+                continue
+            self.values[key] = value
+            if self.on_change is not None:
+                self.on_change(key, value)
+
+    def run(self):
+        with ThreadPoolExecutor(self.workers) as executor:
+            while not self.stopped.is_set():
+                start = time.monotonic()
+                self.poll(executor)
+                self.stopped.wait(max(0.0, start + self.interval() - time.monotonic()))
@@ -0,0 +1,369 @@
+import argparse
+import json
+import multiprocessing
+import queue
+import struct
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import lz4.block
+import numpy as np
+import zmq
+
+try:
+    # Optional, the C implementation is faster than the NumPy fallback below
+    import bitshuffle
+except ImportError:
+    bitshuffle = None
+
+
+# Port of the ZeroMQ PUSH socket of the stream interface on the DCU
+STREAM_PORT = 9999
+
+# Block size in bytes used when encoding bslz4 frames for the replay
+BSLZ4_BLOCK_BYTES = 8192
+
+
+# bslz4: bitshuffled LZ4 blocks behind a header with the total size and the block size
+
+def bitunshuffle(raw, itemsize, count):
+    # Row j of the shuffled data holds bit j of every element, see the bitshuffle library
+    bits = np.unpackbits(np.frombuffer(raw, np.uint8).reshape(itemsize * 8, count // 8), axis=1, bitorder="little")
+    return np.packbits(bits.T, axis=1, bitorder="little").reshape(-1)
+
+
+def bitshuffle_block(raw, itemsize, count):
+    bits = np.unpackbits(np.frombuffer(raw, np.uint8).reshape(count, itemsize), axis=1, bitorder="little")
+    return np.packbits(bits.T, axis=1, bitorder="little").reshape(-1)
+
+
+def decode_bslz4(data, itemsize, out):
+    """Decompress a bslz4 payload into the uint8 array out."""
+    total, block_bytes = struct.unpack_from(">QI", data, 0)
+    count = total // itemsize
+    block_count = block_bytes // itemsize
+
+    if bitshuffle is not None:
+        payload = np.frombuffer(data, np.uint8, offset=12)
+        out[:total] = bitshuffle.decompress_lz4(payload, (count,), np.dtype(f"u{itemsize}"), block_count).view(np.uint8)
+        return
+
+    position = 12
+    done = 0
+    # Every full block and the last partial one, rounded down to a multiple of 8 elements
+    while count - done >= 8:
+        elements = min(block_count, (count - done) // 8 * 8)
+        (size,) = struct.unpack_from(">I", data, position)
+        position += 4
+        raw = lz4.block.decompress(data[position:position + size], uncompressed_size=elements * itemsize)
+        position += size
+        out[done * itemsize:(done + elements) * itemsize] = bitunshuffle(raw, itemsize, elements)
+        done += elements
+
+    # The remaining elements are stored uncompressed
+    out[done * itemsize:total] = np.frombuffer(data, np.uint8, (count - done) * itemsize, position)
+
+
+def encode_bslz4(array, block_bytes=BSLZ4_BLOCK_BYTES):
+    raw = np.ascontiguousarray(array).view(np.uint8).reshape(-1)
+    itemsize = array.dtype.itemsize
+    count = array.size
+    block_count = block_bytes // itemsize
+
+    parts = [struct.pack(">QI", raw.size, block_count * itemsize)]
+    done = 0
+    while count - done >= 8:
+        elements = min(block_count, (count - done) // 8 * 8)
+        shuffled = bitshuffle_block(raw[done * itemsize:(done + elements) * itemsize], itemsize, elements)
+        compressed = lz4.block.compress(shuffled.tobytes(), store_size=False)
+        parts.append(struct.pack(">I", len(compressed)) + compressed)
+        done += elements
+    parts.append(raw[done * itemsize:].tobytes())
+    return b"".join(parts)
+
+
+def frame_dtype(header):
+    # The byte order is the last character of the encoding, e.g. "bs32-lz4<"
+    order = header.get("encoding", "<")[-1]
+    return np.dtype(header["type"]).newbyteorder(order if order in "<>" else "<")
+
+
+def decode_frame(blob, encoding, itemsize, out):
+    """Decode the payload of a dimage message into the uint8 array out."""
+    if encoding.startswith("bs"):
+        decode_bslz4(blob, itemsize, out)
+    elif encoding.startswith("lz4"):
+        out[:] = np.frombuffer(lz4.block.decompress(blob, uncompressed_size=out.size), np.uint8)
+    else:
+        out[:] = np.frombuffer(blob, np.uint8, out.size)
+
+
+def encode_frame(array, encoding):
+    if encoding.startswith("bs"):
+        return encode_bslz4(array)
+    if encoding.startswith("lz4"):
+        return lz4.block.compress(np.ascontiguousarray(array).tobytes(), store_size=False)
+    return np.ascontiguousarray(array).tobytes()
+
+
+# Decoder processes attach to the shared frame buffers once and decode straight into them
+
+_worker_buffers = None
+
+
+def _attach_buffers(name):
+    global _worker_buffers
+    _worker_buffers = shared_memory.SharedMemory(name=name)
+
+
+def _decode_into_slot(offset, nbytes, blob, encoding, itemsize):
+    out = np.ndarray(nbytes, np.uint8, _worker_buffers.buf, offset)
+    decode_frame(blob, encoding, itemsize, out)
+    return offset
+
+
+class FrameBufferPool:
+    """Preallocated frame buffers in shared memory, handed out slot by slot.
+
+    Decoder processes write into a slot and the receiving process reads it
+    through a NumPy view of the same memory, so frames are never copied.
+    """
+
+    def __init__(self, slot_bytes, slots):
+        self.slot_bytes = slot_bytes
+        self.slots = slots
+        self.memory = shared_memory.SharedMemory(create=True, size=slot_bytes * slots)
+
+        self.free = queue.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def acquire(self, timeout=None):
+        # Blocks while all slots are in use, this is the back-pressure on the socket
+        return self.free.get(timeout=timeout)
+
+    def release(self, slot):
+        self.free.put(slot)
+
+    def offset(self, slot):
+        return slot * self.slot_bytes
+
+    def view(self, slot, shape, dtype):
+        return np.ndarray(shape, dtype, self.memory.buf, self.offset(slot))
+
+    def wait_idle(self):
+        # Take every slot back, i.e. wait until all frames are released
+        taken = [self.free.get() for _ in range(self.slots)]
+        for slot in taken:
+            self.free.put(slot)
+
+    def close(self):
+        self.memory.close()
+        self.memory.unlink()
+
+
+class StreamRates:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.bytes = 0
+        self.errors = 0
+        self.last_time = time.monotonic()
+        self.last_frames = 0
+        self.last_bytes = 0
+
+    def add_error(self):
+        with self.lock:
+            self.errors += 1
+
+    def add(self, nbytes):
+        with self.lock:
+            self.frames += 1
+            self.bytes += nbytes
+
+    def rates(self):
+        # Frames/s and MB/s of decoded data since the previous call
+        with self.lock:
+            now = time.monotonic()
+            elapsed = max(now - self.last_time, 1e-9)
+            frame_rate = (self.frames - self.last_frames) / elapsed
+            byte_rate = (self.bytes - self.last_bytes) / elapsed / 1e6
+            self.last_time, self.last_frames, self.last_bytes = now, self.frames, self.bytes
+        return frame_rate, byte_rate
+
+
+class StreamReceiver:
+    """Receives the stream interface messages of one DCU and decodes the frames in a process pool.
+
+    on_frame(info, array, release) is called from a pool thread for every
+    decoded frame. array is a view of a shared buffer that stays valid until
+    release() is called, consumers that keep the data have to copy it. When
+    on_frame is not given, frames are only counted. on_series(message) is
+    called for every dheader and dseries_end message.
+    """
+
+    def __init__(self, ip_address, port=STREAM_PORT, workers=4, slots=16, on_frame=None, on_series=None):
+        # The stream interface listens on the DCU address, not on the HTTP port
+        self.endpoint = f"tcp://{ip_address.split(':')[0]}:{port}"
+        self.workers = workers
+        self.slots = slots
+        self.on_frame = on_frame
+        self.on_series = on_series
+
+        self.pool = None
+        self.executor = None
+        self.stats = StreamRates()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def rates(self):
+        return self.stats.rates()
+
+    def ensure_pool(self, nbytes):
+        if self.pool is not None and self.pool.slot_bytes >= nbytes:
+            return
+
+        # A bigger frame than before, e.g. after a ROI change, needs new buffers
+        self.close_pool()
+        self.pool = FrameBufferPool(nbytes, self.slots)
+        # Forked from a threaded process the decoders could inherit a held lock, they start from a clean server
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("forkserver"),
+                                            initializer=_attach_buffers, initargs=(self.pool.name,))
+
+    def close_pool(self):
+        if self.pool is None:
+            return
+        self.executor.shutdown(wait=True)
+        self.pool.wait_idle()
+        self.pool.close()
+        self.pool = None
+        self.executor = None
+
+    def run(self):
+        context = zmq.Context.instance()
+        socket = context.socket(zmq.PULL)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(self.endpoint)
+
+        try:
+            while not self.stopped.is_set():
+                # Poll with a timeout, so stop() is noticed without a message
+                if not socket.poll(100):
+                    continue
+                self.handle(socket.recv_multipart())
+        finally:
+            socket.close()
+            self.close_pool()
+
+    def handle(self, parts):
+        message = json.loads(parts[0])
+        htype = message.get("htype", "")
+
+        if htype.startswith("dimage-"):
+            self.handle_image(message, parts)
+        elif htype.startswith(("dheader-", "dseries_end-")) and self.on_series is not None:
+            self.on_series(message)
+
+    def handle_image(self, message, parts):
+        header = json.loads(parts[1])
+        blob = parts[2]
+
+        # The shape is given as [x, y]
+        shape = tuple(reversed(header["shape"]))
+        dtype = frame_dtype(header)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+
+        self.ensure_pool(nbytes)
+        pool = self.pool
+        slot = pool.acquire()
+
+        future = self.executor.submit(_decode_into_slot, pool.offset(slot), nbytes, blob,
+                                      header.get("encoding", "<"), dtype.itemsize)
+        info = {"series": message.get("series"), "frame": message.get("frame"), "encoding": header.get("encoding")}
+        future.add_done_callback(lambda f: self.deliver(f, pool, slot, shape, dtype, nbytes, info))
+
+    def deliver(self, future, pool, slot, shape, dtype, nbytes, info):
+        if future.exception() is not None:
+            self.stats.add_error()
+            pool.release(slot)
+            return
+
+        self.stats.add(nbytes)
+        if self.on_frame is None:
+            pool.release(slot)
+        else:
+            self.on_frame(info, pool.view(slot, shape, dtype), lambda: pool.release(slot))
+
+
+class StreamReplay:
+    """Local stand-in for the stream interface, for testing without a DCU.
+
+    Binds a PUSH socket and sends the given frames (an array of shape
+    (n, y, x)) as one series of dheader, dimage and dseries_end messages,
+    optionally paced to rate frames per second.
+    """
+
+    def __init__(self, frames, port=STREAM_PORT, encoding=None, rate=None, series=1):
+        self.frames = frames
+        self.port = port
+        self.encoding = encoding or f"bs{frames.dtype.itemsize * 8}-lz4<"
+        self.rate = rate
+        self.series = series
+
+    def run(self):
+        context = zmq.Context.instance()
+        socket = context.socket(zmq.PUSH)
+        socket.bind(f"tcp://*:{self.port}")
+
+        # Encode everything up front, so the replay rate is not limited by compression
+        blobs = [encode_frame(frame, self.encoding) for frame in self.frames]
+        image_header = json.dumps({"htype": "dimage_d-1.0", "shape": [self.frames.shape[2], self.frames.shape[1]],
+                                   "type": self.frames.dtype.name, "encoding": self.encoding})
+
+        try:
+            socket.send_json({"htype": "dheader-1.0", "series": self.series, "header_detail": "none"})
+
+            start = time.monotonic()
+            for index, blob in enumerate(blobs):
+                if self.rate:
+                    delay = start + index / self.rate - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                socket.send_multipart([
+                    json.dumps({"htype": "dimage-1.0", "series": self.series, "frame": index, "hash": ""}).encode(),
+                    image_header.encode(),
+                    blob,
+                    json.dumps({"htype": "dconfig-1.0", "start_time": 0, "stop_time": 0, "real_time": 0}).encode(),
+                ])
+
+            socket.send_json({"htype": "dseries_end-1.0", "series": self.series})
+        finally:
+            socket.close(linger=-1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded frames as a Simplon stream interface")
+    parser.add_argument("frames", help="NumPy .npy file with an array of shape (n, y, x)")
+    parser.add_argument("--port", type=int, default=STREAM_PORT)
+    parser.add_argument("--encoding", help="bs32-lz4<, lz4< or <, default bslz4")
+    parser.add_argument("--rate", type=float, help="frames per second, default as fast as possible")
+    args = parser.parse_args()
+
+    StreamReplay(np.load(args.frames), args.port, args.encoding, args.rate).run()
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+# The modules live next to EigerGUI.py, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simplon import SimplonClient  # noqa: E402
+from simulator import SimplonSimulator  # noqa: E402
+
+
+@pytest.fixture
+def simulator():
+    simulator = SimplonSimulator(time_scale=0.001, file_size=1 << 16).start()
+    yield simulator
+    simulator.stop()
+
+
+@pytest.fixture
+def client(simulator):
+    client = SimplonClient(simulator.address)
+    yield client
+    client.close()
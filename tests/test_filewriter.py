@@ -0,0 +1,89 @@
+import os
+import time
+
+from filewriter import FilewriterDownloader
+
+
+def acquire_series(client):
+    client.detector_command("arm")
+    client.detector_command("trigger")
+
+
+def run_downloader(client, directory, seconds, partial=None, **options):
+    downloader = FilewriterDownloader(client, directory, interval=0.02, **options)
+    downloader.partial.update(partial or {})
+    downloader.start()
+    time.sleep(seconds)
+    downloader.stop()
+    downloader.thread.join()
+    return downloader
+
+
+def test_download_and_delete(client, simulator, tmp_path):
+    acquire_series(client)
+    names = set(simulator.detector.files)
+
+    downloader = run_downloader(client, tmp_path, 0.5)
+
+    assert set(os.listdir(tmp_path)) == names
+    assert downloader.stats.files == len(names)
+    assert not simulator.detector.files
+
+
+def test_files_kept_on_the_dcu_are_handled_once(client, simulator, tmp_path):
+    acquire_series(client)
+    names = set(simulator.detector.files)
+
+    downloader = run_downloader(client, tmp_path, 0.5, delete=False)
+
+    assert downloader.stats.files == len(names)
+    assert downloader.stats.errors == 0
+    assert set(simulator.detector.files) == names
+    # Two size checks per file until it is stable, none once it is downloaded
+    heads = [row for row in client.stats.snapshot() if row["method"] == "HEAD"]
+    assert heads[0]["count"] == 2 * len(names)
+
+
+def test_complete_part_file_of_an_interrupted_download_is_renamed(client, simulator, tmp_path):
+    acquire_series(client)
+    name = sorted(simulator.detector.files)[0]
+    data = simulator.detector.files[name]
+    (tmp_path / f"{name}.part").write_bytes(data)
+
+    downloader = run_downloader(client, tmp_path, 0.5, partial={name: len(data)})
+
+    assert downloader.stats.errors == 0
+    assert (tmp_path / name).read_bytes() == data
+    assert not (tmp_path / f"{name}.part").exists()
+
+
+def test_part_file_of_another_file_is_not_resumed(client, simulator, tmp_path):
+    acquire_series(client)
+    name = sorted(simulator.detector.files)[0]
+    data = simulator.detector.files[name]
+    # Left over from an older file of the same name and size
+    (tmp_path / f"{name}.part").write_bytes(bytes(len(data)))
+
+    downloader = run_downloader(client, tmp_path, 0.5)
+
+    assert downloader.stats.errors == 0
+    assert (tmp_path / name).read_bytes() == data
+
+
+def test_file_with_an_existing_local_name_is_kept_on_the_dcu(client, simulator, tmp_path):
+    client.set_filewriter_config("name_pattern", "sample1")
+    acquire_series(client)
+    first = dict(simulator.detector.files)
+    run_downloader(client, tmp_path, 0.5)
+    assert not simulator.detector.files
+
+    # A second series under the same name must neither replace the local files nor be deleted
+    acquire_series(client)
+    second = dict(simulator.detector.files)
+    downloader = run_downloader(client, tmp_path, 0.5)
+
+    assert simulator.detector.files == second
+    assert downloader.stats.files == 0
+    assert downloader.stats.errors == len(second)
+    for name, data in first.items():
+        assert (tmp_path / name).read_bytes() == data
@@ -0,0 +1,56 @@
+import numpy as np
+
+from frame_stats import StatsConfig, StatsLog, compute_stats, parse_rois
+
+
+def test_compute_stats_matches_a_plain_computation():
+    frames = np.random.default_rng(3).poisson(3, (4, 32, 64)).astype(np.uint32)
+    limit = np.iinfo(np.uint32).max
+    frames[:, 1, 1] = limit
+    frames[:, 2, 2] = limit - 1
+    frames[:, 3, 3] = 100
+    config = StatsConfig(parse_rois("beam:4:10:8:20"), mask_to_zero=False, hot_threshold=50)
+
+    invalid, flags, work = np.empty(frames.shape, bool), np.empty(frames.shape, bool), np.empty_like(frames)
+    stats = compute_stats(frames, config, invalid, flags, work)
+
+    valid = np.where(frames == limit, 0, frames).astype(np.int64)
+    np.testing.assert_array_equal(stats["total"], valid.sum(axis=(1, 2)))
+    np.testing.assert_array_equal(stats["roi_beam"], valid[:, 4:10, 8:20].sum(axis=(1, 2)))
+    np.testing.assert_array_equal(stats["max"], [limit - 1] * 4)
+    np.testing.assert_array_equal(stats["masked"], [1] * 4)
+    np.testing.assert_array_equal(stats["saturated"], [1] * 4)
+    np.testing.assert_array_equal(stats["hot"], [2] * 4)
+
+
+def test_npy_log_loads_after_every_append(tmp_path):
+    path = str(tmp_path / "stats.npy")
+    dtype = StatsConfig(parse_rois("beam:0:1:0:1")).dtype
+    log = StatsLog(path, dtype)
+
+    written = []
+    for count in (3, 1, 5):
+        rows = np.zeros(count, dtype)
+        rows["number"] = np.arange(len(written), len(written) + count)
+        rows["total"] = rows["number"] * 10
+        log.write(rows)
+        written.extend(rows.tolist())
+
+        loaded = np.load(path)
+        assert loaded.dtype == dtype
+        assert loaded.tolist() == written
+    log.close()
+
+
+def test_csv_log_has_a_header_and_one_line_per_row(tmp_path):
+    path = str(tmp_path / "stats.csv")
+    dtype = StatsConfig().dtype
+    log = StatsLog(path, dtype)
+    rows = np.zeros(2, dtype)
+    rows["total"] = [5, 7]
+    log.write(rows)
+    log.close()
+
+    lines = (tmp_path / "stats.csv").read_text().splitlines()
+    assert lines[0].split(",") == list(dtype.names)
+    assert [int(line.split(",")[dtype.names.index("total")]) for line in lines[1:]] == [5, 7]
@@ -0,0 +1,45 @@
+import pytest
+
+from scan import ScanRunner, expand_steps, sweep_values
+
+ENERGY_SWEEP = [
+    {"config": {"count_time": 0.1, "frame_time": 0.1, "nimages": 1}},
+    {"sweep": {"key": "photon_energy", "start": 8000, "stop": 10000, "step": 1000,
+               "steps": [{"filewriter_config": {"name_pattern": "energy_{value}"}},
+                         {"arm": {"ntrigger": 3}},
+                         {"trigger": {"count": 3, "period": 0.01}},
+                         "disarm"]}},
+]
+
+
+def test_sweep_values():
+    assert sweep_values({"start": 8000, "stop": 10000, "step": 1000}) == [8000, 9000, 10000]
+    assert sweep_values({"values": [1, 3]}) == [1, 3]
+    with pytest.raises(ValueError):
+        sweep_values({"key": "photon_energy", "start": 8000, "stop": 10000, "step": -1000})
+
+
+def test_expand_steps_substitutes_sweep_values():
+    steps = expand_steps(ENERGY_SWEEP)
+
+    assert len(steps) == 1 + 3 * 5
+    assert steps[2] == ("config", {"subsystem": "filewriter", "values": {"name_pattern": "energy_8000"}})
+    assert steps[6] == ("config", {"subsystem": "detector", "values": {"photon_energy": 9000}})
+
+
+@pytest.mark.parametrize("pipeline", [True, False])
+def test_energy_sweep_writes_every_series(client, simulator, pipeline):
+    report = ScanRunner(client, expand_steps(ENERGY_SWEEP), pipeline=pipeline).run()
+
+    assert not report["failed"]
+    names = {name.rsplit("_", 1)[0] for name in simulator.detector.files if name.endswith("_master.h5")}
+    assert names == {"energy_8000", "energy_9000", "energy_10000"}
+    assert simulator.detector.state == "idle"
+
+
+def test_invalid_value_stops_the_plan_before_it_starts(client, simulator):
+    steps = expand_steps([{"config": {"photon_energy": 100.0}}, {"arm": None}])
+
+    with pytest.raises(ValueError, match="photon_energy"):
+        ScanRunner(client, steps).run()
+    assert simulator.detector.sequence_id == 0
@@ -0,0 +1,55 @@
+from simplon import SimplonClient, SimplonTimeout, apply_configs, order_config_changes
+
+
+def test_order_config_changes_puts_energies_first():
+    changes = {"count_time": 0.2, "sample_name": "a", "threshold/1/energy": 5000.0, "photon_energy": 9000.0}
+    keys = [key for key, _ in order_config_changes(changes)]
+    assert keys == ["photon_energy", "threshold/1/energy", "count_time", "sample_name"]
+
+
+def test_apply_configs_keeps_explicit_threshold(client, simulator):
+    # photon_energy resets the threshold, the explicit one has to be sent after it
+    result = apply_configs(client, {"threshold/1/energy": 5000.0, "photon_energy": 9000.0})
+
+    assert result.applied == ["photon_energy", "threshold/1/energy"]
+    assert not result.errors
+    config = simulator.detector.detector_config
+    assert config["threshold/1/energy"]["value"] == 5000.0
+    assert config["incident_energy"]["value"] == 9000.0
+
+
+def test_apply_configs_refetches_changed_keys(client):
+    result = apply_configs(client, {"photon_energy": 9000.0})
+
+    assert set(result.refreshed) == {"photon_energy", "incident_energy", "threshold_energy", "threshold/1/energy"}
+    assert result.refreshed["threshold_energy"]["value"] == 4500.0
+
+
+def test_apply_configs_limits_refetch_to_refresh_keys(client):
+    result = apply_configs(client, {"count_time": 2.0}, refresh_keys=["frame_time"])
+
+    assert set(result.refreshed) == {"frame_time"}
+    assert result.refreshed["frame_time"]["value"] >= 2.0
+
+
+def test_apply_configs_continues_after_a_failed_put(client):
+    result = apply_configs(client, {"trigger_mode": "bogus", "sample_name": "after"})
+
+    assert set(result.errors) == {"trigger_mode"}
+    assert result.errors["trigger_mode"].status_code == 400
+    assert result.applied == ["sample_name"]
+
+
+def test_monitor_image_timeout_is_not_retried(simulator):
+    simulator.server.latency = 0.3
+    client = SimplonClient(simulator.address, read_timeout=0.1)
+    try:
+        try:
+            client.monitor_image("next")
+        except SimplonTimeout:
+            pass
+        else:
+            raise AssertionError("no timeout")
+        assert client.stats.snapshot()[0]["count"] == 1
+    finally:
+        client.close()
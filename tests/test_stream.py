@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+stream = pytest.importorskip("stream")
+bitshuffle = pytest.importorskip("bitshuffle")
+
+SHAPES = [(64, 128), (13, 7)]
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+@pytest.mark.parametrize("dtype", [np.uint16, np.uint32])
+def test_encoded_bslz4_decodes_with_bitshuffle(shape, dtype):
+    array = np.random.default_rng(1).poisson(3, shape).astype(dtype)
+    data = stream.encode_bslz4(array)
+    block_count = stream.BSLZ4_BLOCK_BYTES // array.itemsize
+
+    decoded = bitshuffle.decompress_lz4(np.frombuffer(data, np.uint8, offset=12), array.shape, array.dtype,
+                                        block_count)
+    np.testing.assert_array_equal(decoded, array)
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+@pytest.mark.parametrize("dtype", [np.uint16, np.uint32])
+def test_numpy_decoder_reads_bitshuffle_output(monkeypatch, shape, dtype):
+    array = np.random.default_rng(2).poisson(3, shape).astype(dtype)
+    block_count = stream.BSLZ4_BLOCK_BYTES // array.itemsize
+    header = np.array([array.nbytes], ">u8").tobytes() + np.array([block_count * array.itemsize], ">u4").tobytes()
+    data = header + bitshuffle.compress_lz4(array, block_count).tobytes()
+
+    # The fallback used when bitshuffle is not installed
+    monkeypatch.setattr(stream, "bitshuffle", None)
+    out = np.empty(array.nbytes, np.uint8)
+    stream.decode_bslz4(data, array.itemsize, out)
+    np.testing.assert_array_equal(out.view(dtype).reshape(shape), array)